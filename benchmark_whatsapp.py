@@ -0,0 +1,159 @@
+import os
+import sys
+import io
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+import concurrent.futures
+
+from gerar_exportacao_sintetica import gerar_conversa
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_PADRAO = os.path.join(PASTA_SCRIPT, "gerar_html_whatsappv.1.2.py")
+
+TAMANHOS_PADRAO = [10000, 100000, 1000000]
+
+def carregar_modulo(caminho):
+    """Carrega o script principal como módulo (o nome do arquivo tem pontos)"""
+    spec = importlib.util.spec_from_file_location("gerar_html_whatsapp_bench", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def pico_rss_mb():
+    """Pico de memória residente do processo em MB, quando o sistema informa"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB; macOS, em bytes
+    if sys.platform == "darwin":
+        return pico / 1024 / 1024
+    return pico / 1024
+
+def medir(etapa, funcao, mensagens, tamanho_bytes):
+    """Executa uma etapa sem a saída do script e devolve (resultado, medição)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        segundos = time.perf_counter() - inicio
+    return resultado, {
+        "etapa": etapa,
+        "segundos": segundos,
+        "mensagens_s": mensagens / segundos if segundos else 0.0,
+        "mb_s": tamanho_bytes / 1024 / 1024 / segundos if segundos else 0.0,
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+def medir_tamanho(script, quantidade, formato, pasta, opcoes_gerador):
+    """
+    Gera uma conversa com 'quantidade' mensagens e mede as etapas. Roda em um
+    processo próprio, para o pico de RSS de cada tamanho não herdar o anterior.
+    """
+    modulo = carregar_modulo(script)
+    arquivo_txt = os.path.join(pasta, f"conversa_{formato}_{quantidade}.txt")
+    pasta_midias = os.path.join(pasta, f"midias_{formato}_{quantidade}")
+    gerado = gerar_conversa(arquivo_txt, mensagens=quantidade, formato=formato,
+                            pasta_midias=pasta_midias, **opcoes_gerador)
+    tamanho_txt = gerado["tamanho"]
+    medicoes = []
+
+    mensagens, medicao = medir("parse_whatsapp_txt", lambda: modulo.parse_whatsapp_txt(arquivo_txt),
+                               quantidade, tamanho_txt)
+    medicoes.append(medicao)
+
+    # Resolução de mídias: todos os anexos citados, como na geração do HTML.
+    # Medida a frio (listagem da pasta e índice montados do zero), pois o
+    # índice guarda as consultas já feitas
+    anexos = [anexo for msg in mensagens for anexo in msg.anexos]
+    pasta_resolucao = pasta_midias + os.sep
+
+    def resolver():
+        return sum(1 for anexo in anexos if modulo.verificar_arquivo_existe(anexo, pasta_resolucao))
+
+    modulo._indices_midias.clear()
+    encontrados, medicao = medir("resolução de mídias", resolver, quantidade, tamanho_txt)
+    medicao["anexos"] = len(anexos)
+    medicao["encontrados"] = encontrados
+    medicoes.append(medicao)
+
+    # O HTML também resolve os anexos: começa com o índice vazio, como numa execução normal
+    modulo._indices_midias.clear()
+    conversa = modulo.Conversa(mensagens, pasta_midias=pasta_midias, pasta_html=pasta)
+    html_gerado, medicao = medir("Conversa.gerar_html", conversa.gerar_html, quantidade, tamanho_txt)
+    medicao["saida_mb"] = len(html_gerado.encode("utf-8")) / 1024 / 1024
+    medicoes.append(medicao)
+    del html_gerado
+
+    arquivo_csv = os.path.join(pasta, f"conversa_{formato}_{quantidade}.csv")
+    _, medicao = medir("Conversa.exportar_csv", lambda: conversa.exportar_csv(arquivo_csv),
+                       quantidade, tamanho_txt)
+    medicao["saida_mb"] = os.path.getsize(arquivo_csv) / 1024 / 1024
+    medicoes.append(medicao)
+
+    return {"mensagens": quantidade, "formato": formato, "tamanho_mb": tamanho_txt / 1024 / 1024,
+            "medicoes": medicoes}
+
+def imprimir_resultado(resultado):
+    print(f"\n{resultado['mensagens']} mensagens ({resultado['formato']}, {resultado['tamanho_mb']:.1f} MB):")
+    print(f"   {'Etapa':<26}{'Tempo (s)':>11}{'msgs/s':>13}{'MB/s':>9}{'Pico RSS (MB)':>15}")
+    for medicao in resultado["medicoes"]:
+        rss = medicao["pico_rss_mb"]
+        rss = f"{rss:.1f}" if rss is not None else "-"
+        print(f"   {medicao['etapa']:<26}{medicao['segundos']:>11.3f}{medicao['mensagens_s']:>13.0f}"
+              f"{medicao['mb_s']:>9.1f}{rss:>15}")
+        if "anexos" in medicao:
+            print(f"      {medicao['encontrados']} de {medicao['anexos']} anexos encontrados")
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede o desempenho da leitura, do HTML, do CSV e da resolução de mídias')
+    parser.add_argument('--tamanhos', default=','.join(str(t) for t in TAMANHOS_PADRAO),
+                        help='Quantidades de mensagens, separadas por vírgula (padrão: 10000,100000,1000000)')
+    parser.add_argument('--formatos', default='colchetes,hifen',
+                        help='Formatos gerados, separados por vírgula (padrão: colchetes,hifen)')
+    parser.add_argument('--script', default=SCRIPT_PADRAO, help='Script medido (padrão: gerar_html_whatsappv.1.2.py)')
+    parser.add_argument('--pasta', help='Pasta para os arquivos gerados (padrão: temporária, apagada ao final)')
+    parser.add_argument('--participantes', type=int, default=5, help='Participantes da conversa (padrão: 5)')
+    parser.add_argument('--multilinha', type=float, default=0.1, help='Proporção de mensagens com várias linhas')
+    parser.add_argument('--anexos', type=float, default=0.05, help='Proporção de mensagens com anexo')
+    parser.add_argument('--ruido', type=float, default=0.05, help='Proporção de mensagens com ruído')
+    parser.add_argument('--midias', type=int, help='Arquivos na pasta de mídias (padrão: um por anexo esperado)')
+    parser.add_argument('--semente', type=int, default=0, help='Semente do gerador (padrão: 0)')
+
+    args = parser.parse_args()
+    tamanhos = [int(t) for t in args.tamanhos.split(',') if t.strip()]
+    formatos = [f.strip() for f in args.formatos.split(',') if f.strip()]
+    opcoes_gerador = {
+        "participantes": args.participantes,
+        "proporcao_multilinha": args.multilinha,
+        "proporcao_anexos": args.anexos,
+        "proporcao_ruido": args.ruido,
+        "midias": args.midias,
+        "semente": args.semente,
+    }
+    if resource is None:
+        print("Aviso: módulo resource indisponível; o pico de RSS não será informado")
+
+    pasta = args.pasta or tempfile.mkdtemp(prefix="bench_whatsapp_")
+    os.makedirs(pasta, exist_ok=True)
+    try:
+        for formato in formatos:
+            for quantidade in tamanhos:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                    resultado = executor.submit(medir_tamanho, os.path.abspath(args.script), quantidade,
+                                                formato, pasta, opcoes_gerador).result()
+                imprimir_resultado(resultado)
+    finally:
+        if not args.pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Nomes usados para os participantes sintéticos
+NOMES = ["Ana Souza", "Bruno", "Carlos Lima", "Daniela Rocha", "Eduardo", "Fernanda Alves",
+         "Gustavo", "Helena Martins", "Igor Santos", "Juliana", "Karina Costa", "Lucas Pereira"]
+
+PALAVRAS = ("oi tudo bem sim não amanhã hoje reunião documento enviei recebi processo audiência "
+            "prazo certidão ofício ok certo combinado depois agora cedo tarde noite café endereço").split()
+
+# Ruído comum em exportações reais: marcas de direção (bidi), espaços especiais,
+# texto com codificação trocada (mojibake) e caracteres de compatibilidade
+RUIDO = ["\u200e", "\u200f", "\u202a", "\u202c", "\u00a0", "\u202f",
+         "Ã§Ã£o", "Ã©", "â€œ", "â€™", "ﬁ", "½", "😀", "👍🏽"]
+
+MENSAGENS_SISTEMA = {
+    "colchetes": ["\u200eMensagem apagada", "\u200eLigação de voz perdida", "\u200eáudio ocultado"],
+    "hifen": ["Mensagem apagada", "Ligação de voz perdida", "<Mídia oculta>"],
+}
+
+# (prefixo, extensão) dos anexos gerados
+TIPOS_ANEXO = [("PHOTO", "jpg"), ("VIDEO", "mp4"), ("AUDIO", "opus"), ("DOC", "pdf")]
+PREFIXOS_ANDROID = {"PHOTO": "IMG", "VIDEO": "VID", "AUDIO": "PTT", "DOC": "DOC"}
+
+def nome_anexo(indice, tipo, extensao, momento, formato):
+    """Nome do arquivo de mídia como o WhatsApp grava em cada formato"""
+    if formato == "colchetes":
+        return f"{indice:08d}-{tipo}-{momento:%Y-%m-%d-%H-%M-%S}.{extensao}"
+    return f"{PREFIXOS_ANDROID[tipo]}-{momento:%Y%m%d}-WA{indice % 10000:04d}.{extensao}"
+
+def texto_aleatorio(rnd, palavras_min=2, palavras_max=14):
+    return " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(palavras_min, palavras_max)))
+
+def com_ruido(rnd, texto, no_inicio=False):
+    """Insere um trecho de ruído em uma posição qualquer do texto (ou no início)"""
+    posicao = 0 if no_inicio else rnd.randint(0, len(texto))
+    return texto[:posicao] + rnd.choice(RUIDO) + texto[posicao:]
+
+def cabecalho(momento, formato, usuario=None):
+    if formato == "colchetes":
+        return f"[{momento:%d/%m/%Y, %H:%M:%S}] {usuario}: "
+    if usuario is None:
+        return f"{momento:%d/%m/%Y %H:%M} - "
+    return f"{momento:%d/%m/%Y %H:%M} - {usuario}: "
+
+def gerar_conversa(arquivo_saida, mensagens=10000, participantes=2, formato="colchetes",
+                   proporcao_multilinha=0.1, proporcao_anexos=0.05, proporcao_ruido=0.05,
+                   proporcao_sistema=0.01, midias=None, tamanho_midia=1024,
+                   proporcao_midias_faltando=0.05, pasta_midias=None, semente=0):
+    """
+    Gera uma exportação sintética do WhatsApp. A mesma semente e as mesmas
+    opções geram sempre o mesmo arquivo. Os anexos citados são sorteados de um
+    conjunto de 'midias' nomes; os que não caem em 'proporcao_midias_faltando'
+    são criados em 'pasta_midias' com 'tamanho_midia' bytes cada.
+    Retorna um dicionário com o que foi gerado.
+    """
+    if formato not in ("colchetes", "hifen"):
+        raise ValueError(f"formato desconhecido: {formato}")
+    rnd = random.Random(semente)
+    usuarios = [NOMES[i % len(NOMES)] + (f" {i // len(NOMES) + 1}" if i >= len(NOMES) else "")
+                for i in range(max(1, participantes))]
+
+    # Conjunto de mídias da pasta, citado pelas mensagens com anexo
+    if midias is None:
+        midias = max(1, int(mensagens * proporcao_anexos))
+    inicio = datetime(2024, 1, 1, 8, 0, 0)
+    nomes_midias = []
+    for indice in range(midias):
+        tipo, extensao = TIPOS_ANEXO[indice % len(TIPOS_ANEXO)]
+        momento = inicio + timedelta(seconds=indice * 37)
+        nomes_midias.append(nome_anexo(indice, tipo, extensao, momento, formato))
+
+    momento = inicio
+    linhas = 0
+    anexos = 0
+    with open(arquivo_saida, "w", encoding="utf-8", newline="\n") as f:
+        buffer = []
+        for indice in range(mensagens):
+            momento += timedelta(seconds=rnd.randint(1, 600))
+            sorteio = rnd.random()
+            if sorteio < proporcao_sistema:
+                if formato == "hifen" and rnd.random() < 0.5:
+                    buffer.append(cabecalho(momento, formato) + f"{rnd.choice(usuarios)} adicionou {rnd.choice(NOMES)}")
+                else:
+                    buffer.append(cabecalho(momento, formato, rnd.choice(usuarios))
+                                  + rnd.choice(MENSAGENS_SISTEMA[formato]))
+                linhas += 1
+            else:
+                texto = texto_aleatorio(rnd)
+                anexo = None
+                if nomes_midias and rnd.random() < proporcao_anexos:
+                    anexo = rnd.choice(nomes_midias)
+                    if formato == "colchetes":
+                        texto = f"\u200e<anexado: {anexo}>"
+                    else:
+                        texto = f"{anexo} (arquivo anexado)"
+                    anexos += 1
+                if rnd.random() < proporcao_ruido:
+                    # O ruído não pode quebrar o nome do anexo
+                    texto = com_ruido(rnd, texto, no_inicio=anexo is not None)
+                buffer.append(cabecalho(momento, formato, rnd.choice(usuarios)) + texto)
+                linhas += 1
+                if rnd.random() < proporcao_multilinha:
+                    for _ in range(rnd.randint(1, 3)):
+                        buffer.append(texto_aleatorio(rnd, 0, 10))
+                        linhas += 1
+            if len(buffer) >= 10000:
+                f.write("\n".join(buffer) + "\n")
+                buffer = []
+        if buffer:
+            f.write("\n".join(buffer) + "\n")
+
+    criadas = 0
+    if pasta_midias:
+        os.makedirs(pasta_midias, exist_ok=True)
+        conteudo = bytes(rnd.getrandbits(8) for _ in range(tamanho_midia))
+        for nome in nomes_midias:
+            if rnd.random() < proporcao_midias_faltando:
+                continue
+            with open(os.path.join(pasta_midias, nome), "wb") as f:
+                f.write(conteudo)
+            criadas += 1
+
+    return {
+        "arquivo": arquivo_saida,
+        "mensagens": mensagens,
+        "linhas": linhas,
+        "anexos": anexos,
+        "midias": midias,
+        "midias_criadas": criadas,
+        "tamanho": os.path.getsize(arquivo_saida),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera exportações sintéticas do WhatsApp para testes e benchmarks')
+    parser.add_argument('arquivo', help='Arquivo .txt a ser gerado')
+    parser.add_argument('--mensagens', type=int, default=10000, help='Quantidade de mensagens (padrão: 10000)')
+    parser.add_argument('--participantes', type=int, default=2, help='Quantidade de participantes (padrão: 2)')
+    parser.add_argument('--formato', choices=['colchetes', 'hifen'], default='colchetes',
+                        help='colchetes (iPhone) ou hifen (Android)')
+    parser.add_argument('--multilinha', type=float, default=0.1, help='Proporção de mensagens com várias linhas')
+    parser.add_argument('--anexos', type=float, default=0.05, help='Proporção de mensagens com anexo')
+    parser.add_argument('--ruido', type=float, default=0.05,
+                        help='Proporção de mensagens com marcas bidi, mojibake ou emoji')
+    parser.add_argument('--sistema', type=float, default=0.01, help='Proporção de mensagens de sistema')
+    parser.add_argument('--pasta-midias', help='Cria os arquivos de mídia citados nesta pasta')
+    parser.add_argument('--midias', type=int, help='Quantidade de arquivos de mídia (padrão: um por anexo esperado)')
+    parser.add_argument('--tamanho-midia', type=int, default=1024, help='Tamanho de cada mídia em bytes')
+    parser.add_argument('--midias-faltando', type=float, default=0.05,
+                        help='Proporção de mídias citadas que não são criadas na pasta')
+    parser.add_argument('--semente', type=int, default=0, help='Semente do gerador (padrão: 0)')
+
+    args = parser.parse_args()
+    resumo = gerar_conversa(args.arquivo, mensagens=args.mensagens, participantes=args.participantes,
+                            formato=args.formato, proporcao_multilinha=args.multilinha,
+                            proporcao_anexos=args.anexos, proporcao_ruido=args.ruido,
+                            proporcao_sistema=args.sistema, midias=args.midias,
+                            tamanho_midia=args.tamanho_midia, proporcao_midias_faltando=args.midias_faltando,
+                            pasta_midias=args.pasta_midias, semente=args.semente)
+    print(f"Gerado: {resumo['arquivo']} ({resumo['mensagens']} mensagens, {resumo['linhas']} linhas, "
+          f"{resumo['tamanho'] / 1024 / 1024:.1f} MB)")
+    print(f"Anexos citados: {resumo['anexos']} | mídias criadas: {resumo['midias_criadas']} de {resumo['midias']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,834 +1,3346 @@
-import re
-import os
-import sys
-import csv
-import argparse
-import html
-import unicodedata
-import webbrowser
-import threading
-import time
-import shutil
-from datetime import datetime
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from urllib.parse import unquote
-
-def limpar_nome_arquivo(nome):
-    """Remove caracteres invisÃ­veis e normaliza o nome do arquivo"""
-    if not nome:
-        return ""
-    
-    nome = unicodedata.normalize('NFKC', nome)
-    # Remove caracteres invisÃ­veis comuns do WhatsApp
-    for ch in ['\u200e', '\u200f', '\ufeff', '\xa0', 'â€Ž']:
-        nome = nome.replace(ch, '')
-    
-    # Remove caracteres de controle Unicode
-    nome = ''.join(c for c in nome if not unicodedata.category(c).startswith('C'))
-    return nome.strip()
-
-def limpar_linha(linha):
-    """Remove caracteres invisÃ­veis e normaliza a linha para processamento"""
-    if not linha:
-        return ""
-    
-    # Remove caracteres de direção de texto e outros invisíveis
-    linha = re.sub(r'[\u200e\u200f\ufeff]', '', linha)
-    # Remove espaços não-breaking
-    linha = linha.replace('\xa0', ' ')
-    # Remove sequências mal codificadas comuns
-    linha = linha.replace('â€Ž', '')
-    linha = linha.replace('â€', '')
-    # Normaliza Unicode
-    linha = unicodedata.normalize('NFKC', linha)
-    # Normaliza espaços múltiplos
-    linha = ' '.join(linha.split())
-    return linha
-
-def e_nova_mensagem(linha):
-    """Verifica se a linha corresponde ao início de uma nova mensagem"""
-    linha_limpa = limpar_linha(linha)
-    if not linha_limpa:
-        return False
-    
-    # Padrões mais robustos para detectar nova mensagem
-    patterns = [
-        r'^\[(\d{1,2}\/\d{1,2}\/\d{4}),\s*(\d{1,2}:\d{2}:\d{2})\]\s*([^:]+?):\s*(.*)$',  # [DD/MM/YYYY, HH:MM:SS] Usuario: texto
-        r'^(\d{2}\/\d{2}\/\d{4})\s+(\d{2}:\d{2})\s*-\s*([^:]+?):\s*(.*)$',  # DD/MM/YYYY HH:MM - Usuario: texto
-        r'^(\d{2}\/\d{2}\/\d{4})\s+(\d{2}:\d{2})\s*-\s*(.*)$',  # DD/MM/YYYY HH:MM - Mensagem sistema
-        r'^\[(\d{1,2}\/\d{1,2}\/\d{4}),\s*(\d{1,2}:\d{2}:\d{2})\]\s*([^:]*?):\s*$',  # Mensagem vazia
-    ]
-    
-    for pattern in patterns:
-        if re.match(pattern, linha_limpa):
-            return True
-    
-    # Verifica se é mensagem do sistema (sem usuário)
-    if re.match(r'^(\d{2}\/\d{2}\/\d{4})\s+(\d{2}:\d{2})\s*-\s*', linha_limpa):
-        return True
-        
-    return False
-
-def verificar_arquivo_existe(nome_arquivo, pasta_midias):
-    """Verifica se o arquivo existe, testando diferentes possibilidades"""
-    if not pasta_midias or not nome_arquivo:
-        return None
-        
-    # Testa o nome exato
-    caminho_completo = os.path.join(pasta_midias, nome_arquivo)
-    if os.path.isfile(caminho_completo):
-        return caminho_completo
-    
-    # Testa sem prefixos numÃ©ricos (00000006- etc)
-    nome_sem_prefixo = re.sub(r'^\d+-', '', nome_arquivo)
-    if nome_sem_prefixo != nome_arquivo:
-        caminho_sem_prefixo = os.path.join(pasta_midias, nome_sem_prefixo)
-        if os.path.isfile(caminho_sem_prefixo):
-            return caminho_sem_prefixo
-    
-    # Busca por padrÃ£o similar na pasta (case-insensitive)
-    try:
-        arquivos_pasta = os.listdir(pasta_midias)
-        nome_base = nome_sem_prefixo.lower()
-        
-        for arquivo in arquivos_pasta:
-            if nome_base in arquivo.lower() or arquivo.lower() in nome_base:
-                return os.path.join(pasta_midias, arquivo)
-    except Exception:
-        pass
-    
-    return None
-
-class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, pasta_anexos=None, **kwargs):
-        self.pasta_anexos = pasta_anexos
-        super().__init__(*args, **kwargs)
-    
-    def do_GET(self):
-        path = self.path.split('?')[0]
-        
-        if path.startswith('/anexos/'):
-            nome_arquivo = unquote(path[8:])  # Remove '/anexos/'
-            if self.pasta_anexos:
-                arquivo_real = os.path.join(self.pasta_anexos, nome_arquivo)
-                if os.path.isfile(arquivo_real):
-                    with open(arquivo_real, 'rb') as f:
-                        self.send_response(200)
-                        
-                        # Define Content-Type baseado na extensÃ£o
-                        if nome_arquivo.lower().endswith('.pdf'):
-                            self.send_header('Content-Type', 'application/pdf')
-                        elif nome_arquivo.lower().endswith(('.jpg', '.jpeg')):
-                            self.send_header('Content-Type', 'image/jpeg')
-                        elif nome_arquivo.lower().endswith('.png'):
-                            self.send_header('Content-Type', 'image/png')
-                        else:
-                            self.send_header('Content-Type', 'application/octet-stream')
-                        
-                        self.send_header('Content-Disposition', f'inline; filename="{nome_arquivo}"')
-                        self.end_headers()
-                        
-                        shutil.copyfileobj(f, self.wfile)
-                    return
-        
-        super().do_GET()
-
-def criar_servidor_temporario(pasta_anexos, porta=8000):
-    """Cria um servidor HTTP temporÃ¡rio para servir os arquivos"""
-    def handler(*args, **kwargs):
-        return CustomHTTPRequestHandler(*args, pasta_anexos=pasta_anexos, **kwargs)
-    
-    httpd = HTTPServer(('localhost', porta), handler)
-    return httpd
-
-def iniciar_servidor_background(pasta_anexos, porta=8000):
-    """Inicia servidor em background"""
-    httpd = criar_servidor_temporario(pasta_anexos, porta)
-    
-    def servidor_thread():
-        print(f"Servidor local iniciado em http://localhost:{porta}")
-        print("Mantenha este terminal aberto enquanto visualiza os anexos")
-        httpd.serve_forever()
-    
-    thread = threading.Thread(target=servidor_thread, daemon=True)
-    thread.start()
-    return httpd
-
-def gerar_html_anexo(anexo, pasta_midias, usar_servidor=False, porta=8000, pasta_html=""):
-    """Gera HTML especÃ­fico para cada tipo de anexo"""
-    caminho_arquivo = verificar_arquivo_existe(anexo, pasta_midias)
-    
-    if not caminho_arquivo:
-        return f'<span style="color:red;font-size:90%;background:#ffe6e6;padding:2px 6px;border-radius:3px;">Arquivo "{anexo}" nÃ£o encontrado</span>'
-    
-    nome_arquivo = os.path.basename(caminho_arquivo)
-    extensao = nome_arquivo.lower().split('.')[-1] if '.' in nome_arquivo else ''
-    
-    if usar_servidor:
-        caminho_url = f"http://localhost:{porta}/anexos/{nome_arquivo}"
-    else:
-        if pasta_html:
-            pasta_anexos_local = os.path.join(pasta_html, "anexos_conversa")
-            os.makedirs(pasta_anexos_local, exist_ok=True)
-            
-            destino_arquivo = os.path.join(pasta_anexos_local, nome_arquivo)
-            if not os.path.exists(destino_arquivo):
-                shutil.copy2(caminho_arquivo, destino_arquivo)
-            
-            caminho_url = f"anexos_conversa/{nome_arquivo}"
-        else:
-            caminho_url = nome_arquivo
-    
-    if extensao in ['jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp']:
-        return f'''
-        <div style="margin:8px 0;">
-            <strong>ðŸ–¼ï¸ {nome_arquivo}</strong><br>
-            <img src="{caminho_url}" alt="{nome_arquivo}" 
-                 style="max-width:400px;max-height:300px;border-radius:8px;margin:5px 0;border:1px solid #ddd;cursor:pointer;"
-                 onclick="window.open(this.src, '_blank')" onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
-            <div style="display:none;padding:20px;background:#f0f0f0;text-align:center;border-radius:8px;">
-                <p>Erro ao carregar imagem</p>
-                <a href="{caminho_url}" target="_blank" style="color:#1976d2;">Clique para abrir</a>
-            </div>
-        </div>'''
-    
-    elif extensao == 'pdf':
-        if usar_servidor:
-            return f'''
-            <div style="border:1px solid #ccc;padding:12px;margin:8px 0;border-radius:8px;background:#f9f9f9;max-width:500px;">
-                <strong>ðŸ"„ {nome_arquivo}</strong><br>
-                <iframe src="{caminho_url}" width="100%" height="400px" style="margin-top:8px;border:none;border-radius:4px;"></iframe>
-                <br><a href="{caminho_url}" target="_blank" 
-                       style="display:inline-block;padding:8px 16px;background:#dc3545;color:white;text-decoration:none;border-radius:4px;font-weight:bold;margin-top:8px;">
-                       ðŸ"„ ABRIR PDF EM NOVA ABA</a>
-            </div>'''
-        else:
-            return f'''
-            <div style="border:1px solid #ccc;padding:12px;margin:8px 0;border-radius:8px;background:#f9f9f9;max-width:500px;">
-                <strong>ðŸ"„ {nome_arquivo}</strong><br>
-                <div style="text-align:center;padding:20px;background:#f0f0f0;margin:8px 0;border-radius:4px;">
-                    <p style="margin:0 0 10px 0;">ðŸ"„ Documento PDF</p>
-                    <p style="font-size:12px;color:#666;margin:0 0 15px 0;">Arquivo copiado para a pasta local</p>
-                    <a href="{caminho_url}" target="_blank" download="{nome_arquivo}"
-                       style="display:inline-block;padding:10px 20px;background:#dc3545;color:white;text-decoration:none;border-radius:6px;font-weight:bold;">
-                       ðŸ"„ BAIXAR PDF</a>
-                </div>
-            </div>'''
-    
-    elif extensao in ['mp4', 'mov', 'avi', 'mkv', 'webm']:
-        return f'''
-        <div style="margin:8px 0;">
-            <strong>ðŸŽ¬ {nome_arquivo}</strong><br>
-            <video controls style="max-width:400px;border-radius:8px;margin:5px 0;">
-                <source src="{caminho_url}" type="video/{extensao}">
-                Seu navegador nÃ£o suporta reproduÃ§Ã£o de vÃ­deo.
-                <p><a href="{caminho_url}" target="_blank" download="{nome_arquivo}">Clique para baixar o vÃ­deo</a></p>
-            </video>
-        </div>'''
-    
-    elif extensao in ['mp3', 'wav', 'ogg', 'm4a', 'aac']:
-        return f'''
-        <div style="margin:8px 0;padding:8px;background:#f0f8ff;border-radius:8px;max-width:350px;">
-            <strong>ðŸŽµ {nome_arquivo}</strong><br>
-            <audio controls style="width:100%;margin-top:5px;">
-                <source src="{caminho_url}" type="audio/{extensao}">
-                Seu navegador nÃ£o suporta reproduÃ§Ã£o de Ã¡udio.
-                <p><a href="{caminho_url}" target="_blank" download="{nome_arquivo}">Clique para baixar o Ã¡udio</a></p>
-            </audio>
-        </div>'''
-    
-    else:
-        return f'''
-        <div style="border:1px solid #e0e0e0;padding:10px;margin:5px 0;border-radius:4px;background:#f8f9fa;display:inline-block;">
-            <strong>ðŸ"Ž {nome_arquivo}</strong><br>
-            <a href="{caminho_url}" target="_blank" download="{nome_arquivo}"
-               style="display:inline-block;margin-top:5px;padding:6px 12px;background:#007bff;color:white;text-decoration:none;border-radius:3px;">
-               ðŸ'¾ BAIXAR ARQUIVO</a>
-        </div>'''
-
-def processar_anexos(texto):
-    """Processa diferentes tipos de anexos e referÃªncias de mÃ­dia"""
-    anexos_encontrados = []
-    
-    # Diferentes padrÃµes de anexos
-    patterns = [
-        r'<anexado:\s*([^>]+)>',  # <anexado: arquivo>
-        r'([^\sâ€Ž/\\]+(?:\s+[^\sâ€Ž/\\]*)*\.(?:pdf|jpg|jpeg|png|mp4|mp3|doc|docx|xls|xlsx|wav|ogg|m4a|avi|mov|mkv|webm|gif|bmp|aac|ppt|pptx|opus))\s*â€¢',
-        r'â€Ž<anexado:\s*([^>]+)>',
-        r'([^â€Ž\s/\\]+\.(?:pdf|jpg|jpeg|png|mp4|mp3|doc|docx|xls|xlsx|wav|ogg|m4a|avi|mov|mkv|webm|gif|bmp|aac|ppt|pptx|opus))(?!\s*â€¢)'
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, texto, re.IGNORECASE)
-        anexos_encontrados.extend(matches)
-    
-    # Limpa anexos
-    anexos_limpos = []
-    for anexo in anexos_encontrados:
-        anexo_limpo = limpar_nome_arquivo(anexo.strip())
-        if anexo_limpo:
-            anexos_limpos.append(anexo_limpo)
-    
-    return list(set(anexos_limpos))  # Remove duplicatas
-
-def parse_whatsapp_txt(arquivo_txt):
-    """
-    LÃª o arquivo .txt exportado do WhatsApp e retorna mensagens.
-    SUPORTA AMBOS FORMATOS:
-    - Formato com colchetes: [DD/MM/AAAA, HH:MM:SS] Usuario: texto
-    - Formato sem colchetes: DD/MM/AAAA HH:MM - Usuario: texto
-    """
-    mensagens = []
-    
-    try:
-        with open(arquivo_txt, encoding="utf-8") as f:
-            linhas = f.readlines()
-    except UnicodeDecodeError:
-        for encoding in ['latin1', 'cp1252', 'iso-8859-1']:
-            try:
-                with open(arquivo_txt, encoding=encoding) as f:
-                    linhas = f.readlines()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise Exception("NÃ£o foi possÃ­vel decodificar o arquivo.")
-
-    print(f"Lendo {len(linhas)} linhas do arquivo...")
-
-    # ExpressÃµes regulares mais robustas para os dois formatos
-    regex_colchetes = re.compile(r'^\[(\d{1,2}\/\d{1,2}\/\d{4}),\s*(\d{1,2}:\d{2}:\d{2})\]\s*([^:]+?):\s*(.*)$')
-    regex_hifen = re.compile(r'^(\d{2}\/\d{2}\/\d{4})\s+(\d{2}:\d{2})\s*-\s*([^:]+?):\s*(.*)$')
-    regex_sistema = re.compile(r'^(\d{2}\/\d{2}\/\d{4})\s+(\d{2}:\d{2})\s*-\s*(.*)$')
-
-    msg_atual = None
-    mensagens_processadas = 0
-    formato_detectado = None
-    
-    for numero_linha, linha_original in enumerate(linhas, 1):
-        linha_original = linha_original.strip()
-        if not linha_original:
-            continue
-        
-        # Limpa a linha para análise
-        linha_limpa = limpar_linha(linha_original)
-        if not linha_limpa:
-            continue
-
-        # Verifica se é uma nova mensagem
-        if e_nova_mensagem(linha_limpa):
-            # Finaliza mensagem anterior se existir
-            if msg_atual:
-                mensagens.append(msg_atual)
-                mensagens_processadas += 1
-
-            # Testa formato com colchetes
-            match_colchetes = regex_colchetes.match(linha_limpa)
-            # Testa formato com hÃ­fen
-            match_hifen = regex_hifen.match(linha_limpa)
-            # Testa mensagem de sistema
-            match_sistema = regex_sistema.match(linha_limpa)
-            
-            if match_colchetes:
-                if not formato_detectado:
-                    formato_detectado = "COLCHETES"
-                    print(f"Formato detectado: [DD/MM/AAAA, HH:MM:SS] Usuario: texto")
-                
-                data_str, hora_str, usuario, texto = match_colchetes.groups()
-                
-                # Processa anexos
-                anexos_encontrados = processar_anexos(texto)
-                info_extra = ", ".join(anexos_encontrados) if anexos_encontrados else ""
-
-                # Limpa texto
-                texto_limpo = re.sub(r'<anexado:[^>]*>', '', texto)
-                texto_limpo = limpar_linha(texto_limpo)
-
-                # Processa timestamp
-                try:
-                    dt = datetime.strptime(f"{data_str} {hora_str}", "%d/%m/%Y %H:%M:%S")
-                    timestamp_iso = dt.isoformat(sep=' ')
-                except Exception:
-                    timestamp_iso = f"{data_str} {hora_str}"
-
-                # Detecta tipo de mensagem
-                tipo_msg = "mensagem"
-                if "Ligação" in texto or "ligação" in texto or "Ligacao" in texto:
-                    tipo_msg = "ligacao"
-                elif "Mensagem apagada" in texto:
-                    tipo_msg = "apagada"
-                elif "áudio ocultado" in texto or "audio ocultado" in texto:
-                    tipo_msg = "audio_oculto"
-                elif any(palavra in texto.lower() for palavra in ["mudou o nome", "saiu", "foi adicionado", "removeu", "entrou"]):
-                    tipo_msg = "sistema"
-
-                msg_atual = {
-                    "user": usuario.strip(),
-                    "texto": texto_limpo,
-                    "timestamp": timestamp_iso,
-                    "info_extra": info_extra,
-                    "tipo": tipo_msg,
-                    "linha": numero_linha
-                }
-                
-            elif match_hifen:
-                if not formato_detectado:
-                    formato_detectado = "HÍFEN"
-                    print(f"Formato detectado: DD/MM/AAAA HH:MM - Usuario: texto")
-                
-                data_str, hora_str, usuario, texto = match_hifen.groups()
-                
-                anexos_encontrados = processar_anexos(texto)
-                info_extra = ", ".join(anexos_encontrados) if anexos_encontrados else ""
-
-                texto_limpo = re.sub(r'<anexado:[^>]*>', '', texto)
-                texto_limpo = limpar_linha(texto_limpo)
-
-                try:
-                    dt = datetime.strptime(f"{data_str} {hora_str}:00", "%d/%m/%Y %H:%M:%S")
-                    timestamp_iso = dt.isoformat(sep=' ')
-                except Exception:
-                    timestamp_iso = f"{data_str} {hora_str}:00"
-
-                tipo_msg = "mensagem"
-                if "Ligação" in texto or "ligação" in texto or "Ligacao" in texto:
-                    tipo_msg = "ligacao"
-                elif "Mensagem apagada" in texto:
-                    tipo_msg = "apagada"
-
-                msg_atual = {
-                    "user": usuario.strip(),
-                    "texto": texto_limpo,
-                    "timestamp": timestamp_iso,
-                    "info_extra": info_extra,
-                    "tipo": tipo_msg,
-                    "linha": numero_linha
-                }
-                
-            elif match_sistema:
-                data_str, hora_str, texto = match_sistema.groups()
-                
-                try:
-                    dt = datetime.strptime(f"{data_str} {hora_str}:00", "%d/%m/%Y %H:%M:%S")
-                    timestamp_iso = dt.isoformat(sep=' ')
-                except Exception:
-                    timestamp_iso = f"{data_str} {hora_str}:00"
-
-                msg_atual = {
-                    "user": "Sistema",
-                    "texto": limpar_linha(texto),
-                    "timestamp": timestamp_iso,
-                    "info_extra": "",
-                    "tipo": "sistema",
-                    "linha": numero_linha
-                }
-            
-        else:
-            # Verifica se realmente deve ser continuação da mensagem anterior
-            if msg_atual and linha_limpa:
-                # Processa anexos na linha
-                anexos_linha = processar_anexos(linha_limpa)
-                if anexos_linha:
-                    anexos_existentes = [a.strip() for a in msg_atual["info_extra"].split(",") if a.strip()]
-                    anexos_existentes.extend(anexos_linha)
-                    msg_atual["info_extra"] = ", ".join(set(anexos_existentes))
-                
-                # Remove referências de anexos da linha
-                linha_texto = re.sub(r'<anexado:[^>]*>', '', linha_limpa)
-                linha_texto = limpar_linha(linha_texto)
-                
-                if linha_texto:
-                    if msg_atual["texto"]:
-                        msg_atual["texto"] += "\n" + linha_texto
-                    else:
-                        msg_atual["texto"] = linha_texto
-
-    # Adiciona última mensagem
-    if msg_atual:
-        mensagens.append(msg_atual)
-        mensagens_processadas += 1
-
-    print(f"Processamento concluído: {mensagens_processadas} mensagens encontradas")
-    if formato_detectado:
-        print(f"Formato usado: {formato_detectado}")
-        
-    if mensagens_processadas == 0:
-        print("ATENÇÃO: Nenhuma mensagem foi processada!")
-        print("Verificando primeiras linhas do arquivo:")
-        for i, linha in enumerate(linhas[:5]):
-            linha_original = linha.strip()
-            linha_limpa = limpar_linha(linha_original)
-            print(f"   Linha {i+1}:")
-            print(f"      Original: {repr(linha_original)}")
-            print(f"      Limpa: {repr(linha_limpa)}")
-            print(f"      É nova msg? {e_nova_mensagem(linha_limpa)}")
-            
-            test_colchetes = regex_colchetes.match(linha_limpa)
-            test_hifen = regex_hifen.match(linha_limpa)
-            
-            if test_colchetes:
-                print(f"      ✅ COLCHETES MATCH: {test_colchetes.groups()}")
-            elif test_hifen:
-                print(f"      ✅ HÍFEN MATCH: {test_hifen.groups()}")
-            else:
-                print(f"      ❌ NÃO MATCHOU nenhum padrão")
-            print()
-
-    return mensagens
-
-class Conversa:
-    def __init__(self, mensagens, pasta_midias="", usar_servidor=False, porta=8000, pasta_html=""):
-        self.mensagens = mensagens
-        if pasta_midias and not pasta_midias.endswith(os.sep):
-            pasta_midias += os.sep
-        self.pasta_midias = pasta_midias
-        self.usar_servidor = usar_servidor
-        self.porta = porta
-        self.pasta_html = pasta_html
-
-    def gerar_html(self):
-        # Calcula estatÃ­sticas
-        total_msgs = len(self.mensagens)
-        usuarios = sorted(set(msg.get("user", "Desconhecido") for msg in self.mensagens))
-        msgs_por_usuario = {}
-        anexos_total = 0
-        
-        for msg in self.mensagens:
-            user = msg.get("user", "Desconhecido")
-            msgs_por_usuario[user] = msgs_por_usuario.get(user, 0) + 1
-            if msg.get("info_extra"):
-                anexos_total += len([a for a in msg.get("info_extra", "").split(",") if a.strip()])
-
-        html_content = '''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Conversa WhatsApp - AnÃ¡lise Investigativa</title>
-            <style>
-                body { 
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    padding: 20px; 
-                    margin: 0;
-                    min-height: 100vh;
-                }
-                .container {
-                    max-width: 900px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 15px;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-                    overflow: hidden;
-                }
-                .header {
-                    background: #075e54;
-                    color: white;
-                    padding: 20px;
-                    text-align: center;
-                }
-                .stats {
-                    background: #f8f9fa;
-                    padding: 20px;
-                    border-bottom: 2px solid #dee2e6;
-                    font-size: 14px;
-                    color: #495057;
-                    font-weight: 500;
-                }
-                .stats-title {
-                    font-size: 16px;
-                    font-weight: bold;
-                    margin-bottom: 10px;
-                    color: #075e54;
-                }
-                .chat-area {
-                    padding: 20px;
-                    background: #e5ddd5;
-                    min-height: 500px;
-                }
-                .msg { 
-                    padding: 12px 18px; 
-                    margin-bottom: 15px; 
-                    border-radius: 15px; 
-                    max-width: 70%; 
-                    clear: both; 
-                    word-wrap: break-word;
-                    box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-                    position: relative;
-                }
-                .user1 { 
-                    background: #dcf8c6; 
-                    float: right; 
-                    text-align: left;
-                    border-bottom-right-radius: 5px;
-                }
-                .user2 { 
-                    background: white; 
-                    float: left; 
-                    text-align: left;
-                    border-bottom-left-radius: 5px;
-                }
-                .sistema {
-                    background: #fff3cd;
-                    border: 1px solid #ffeaa7;
-                    margin: 10px auto;
-                    text-align: center;
-                    max-width: 80%;
-                    float: none;
-                    font-style: italic;
-                    color: #856404;
-                }
-                .ligacao {
-                    background: #d1ecf1;
-                    border: 1px solid #bee5eb;
-                    color: #0c5460;
-                }
-                .apagada {
-                    background: #f8d7da;
-                    border: 1px solid #f5c6cb;
-                    color: #721c24;
-                    font-style: italic;
-                }
-                .username {
-                    font-weight: bold;
-                    color: #075e54;
-                    margin-bottom: 5px;
-                    font-size: 14px;
-                }
-                .timestamp { 
-                    font-size: 11px; 
-                    color: #666; 
-                    margin-top: 8px; 
-                    display: block;
-                    text-align: right;
-                }
-                .clear { clear: both; height: 0; }
-                .anexo {
-                    margin-top: 8px;
-                }
-                @media(max-width:768px) { 
-                    .msg { max-width: 90%; }
-                    body { padding: 10px; }
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>ðŸ"± AnÃ¡lise de Conversa WhatsApp</h1>
-                    <p>Processado em: ''' + datetime.now().strftime("%d/%m/%Y Ã s %H:%M:%S") + '''</p>
-                </div>
-                <div class="stats">
-                    <div class="stats-title">ðŸ"Š EstatÃ­sticas da Conversa:</div>
-                    <strong>Total de mensagens:</strong> ''' + str(total_msgs) + '''<br>
-                    <strong>Total de anexos:</strong> ''' + str(anexos_total) + '''<br>
-                    <strong>Participantes:</strong> ''' + ", ".join(usuarios) + '''<br>
-                    <strong>Mensagens por usuÃ¡rio:</strong> ''' + " | ".join([f"{u}: {c}" for u, c in msgs_por_usuario.items()]) + '''
-                </div>
-                <div class="chat-area">
-        '''
-
-        # Mapeia usuÃ¡rios
-        mapa_usuarios = {}
-        if len(usuarios) >= 1:
-            mapa_usuarios[usuarios[0]] = "user1"
-        if len(usuarios) >= 2:
-            mapa_usuarios[usuarios[1]] = "user2"
-
-        # Processa mensagens
-        for msg in self.mensagens:
-            user = msg.get("user", "Desconhecido")
-            cor = mapa_usuarios.get(user, "user1")
-            texto = html.escape(msg.get("texto", ""))
-            tstamp = msg.get("timestamp", "")
-            info_extra = msg.get("info_extra", "")
-            tipo = msg.get("tipo", "mensagem")
-
-            # Adiciona classes especÃ­ficas para tipos especiais
-            classes = [cor]
-            if tipo != "mensagem":
-                classes.append(tipo)
-
-            html_content += f'<div class="msg {" ".join(classes)}">'
-            html_content += f'<div class="username">{html.escape(user)}</div>'
-            
-            # ConteÃºdo da mensagem
-            if texto.strip():
-                html_content += f'<div>{texto}</div>'
-            
-            # Anexos
-            if info_extra:
-                anexos = [anexo.strip() for anexo in info_extra.split(",") if anexo.strip()]
-                for anexo in anexos:
-                    html_content += f'<div class="anexo">{gerar_html_anexo(anexo, self.pasta_midias, self.usar_servidor, self.porta, self.pasta_html)}</div>'
-            
-            html_content += f'<div class="timestamp">{tstamp}</div>'
-            html_content += '</div>\n'
-            html_content += '<div class="clear"></div>\n'
-
-        html_content += '''
-                </div>
-            </div>
-        </body>
-        </html>
-        '''
-
-        return html_content
-
-    def exportar_csv(self, arquivo_saida):
-        """Exporta mensagens em formato CSV para anÃ¡lise"""
-        with open(arquivo_saida, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Timestamp', 'Usuario', 'Texto', 'Anexos', 'Tipo', 'Linha'])
-            for msg in self.mensagens:
-                writer.writerow([
-                    msg.get('timestamp', ''),
-                    msg.get('user', ''),
-                    msg.get('texto', ''),
-                    msg.get('info_extra', ''),
-                    msg.get('tipo', 'mensagem'),
-                    msg.get('linha', '')
-                ])
-
-def main():
-    parser = argparse.ArgumentParser(
-        description='Conversor de conversas WhatsApp para HTML com suporte a anexos',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog='''
-Exemplos de uso:
-  python whatsapp_converter.py conversa.txt
-  python whatsapp_converter.py conversa.txt --pasta-midias ./anexos/
-  python whatsapp_converter.py conversa.txt --pasta-midias ./anexos/ --servidor
-        '''
-    )
-    
-    parser.add_argument('arquivo', help='Arquivo .txt da conversa exportada do WhatsApp')
-    parser.add_argument('--pasta-midias', help='Pasta contendo os arquivos de mÃ­dia e anexos')
-    parser.add_argument('--exportar-csv', action='store_true', help='Exportar tambÃ©m em formato CSV')
-    parser.add_argument('--servidor', action='store_true', help='Iniciar servidor web local para visualizar anexos')
-    parser.add_argument('--standalone', action='store_true', help='Criar versÃ£o standalone copiando anexos localmente')
-    parser.add_argument('--porta', type=int, default=8000, help='Porta do servidor local (padrÃ£o: 8000)')
-    parser.add_argument('--encoding', default='utf-8', help='CodificaÃ§Ã£o do arquivo (padrÃ£o: utf-8)')
-    
-    args = parser.parse_args()
-
-    # VerificaÃ§Ãµes
-    if not os.path.isfile(args.arquivo):
-        print(f"Arquivo nÃ£o encontrado: {args.arquivo}")
-        sys.exit(1)
-
-    if args.pasta_midias and not os.path.isdir(args.pasta_midias):
-        print(f"Pasta de mÃ­dias nÃ£o encontrada: {args.pasta_midias}")
-        print("Continuando sem anexos...")
-        args.pasta_midias = ""
-
-    print(f"Lendo arquivo: {args.arquivo}")
-    if args.pasta_midias:
-        print(f"Pasta de mÃ­dias: {args.pasta_midias}")
-        arquivos_midias = len([f for f in os.listdir(args.pasta_midias) if os.path.isfile(os.path.join(args.pasta_midias, f))])
-        print(f"Encontrados {arquivos_midias} arquivos na pasta de mÃ­dias")
-
-    try:
-        mensagens = parse_whatsapp_txt(args.arquivo)
-        print(f"Processadas {len(mensagens)} mensagens")
-        
-        if len(mensagens) == 0:
-            print("ERRO: Nenhuma mensagem foi processada!")
-            print("PossÃ­veis causas:")
-            print("   â€¢ Formato do arquivo diferente do esperado")
-            print("   â€¢ Problema de codificaÃ§Ã£o de caracteres")
-            print("   â€¢ Arquivo corrompido ou vazio")
-            return
-        
-        # Conta anexos encontrados
-        anexos_encontrados = 0
-        anexos_detalhes = []
-        for msg in mensagens:
-            if msg.get("info_extra"):
-                anexos_na_msg = [a.strip() for a in msg.get("info_extra", "").split(",") if a.strip()]
-                anexos_encontrados += len(anexos_na_msg)
-                anexos_detalhes.extend(anexos_na_msg)
-        
-        if anexos_encontrados > 0:
-            print(f"Encontrados {anexos_encontrados} anexos nas mensagens:")
-            for anexo in set(anexos_detalhes):
-                caminho_encontrado = verificar_arquivo_existe(anexo, args.pasta_midias or "")
-                status = "ENCONTRADO" if caminho_encontrado else "NÃƒO ENCONTRADO"
-                print(f"   - {anexo} â†' {status}")
-        else:
-            print("Nenhum anexo foi detectado nas mensagens")
-
-        # Inicia servidor se solicitado
-        httpd = None
-        pasta_html_base = ""
-        
-        if args.servidor and args.pasta_midias and anexos_encontrados > 0:
-            httpd = iniciar_servidor_background(args.pasta_midias, args.porta)
-            time.sleep(1)  # Aguarda servidor iniciar
-        elif args.standalone or (not args.servidor and args.pasta_midias):
-            # Modo standalone: cria pasta para copiar anexos
-            pasta_html_base = os.path.dirname(os.path.abspath(args.arquivo))
-
-        gerador = Conversa(mensagens, args.pasta_midias or "", args.servidor, args.porta, pasta_html_base)
-        conteudo_html = gerador.gerar_html()
-
-        # Gera arquivo HTML
-        arquivo_saida_html = os.path.splitext(args.arquivo)[0] + "_conversa.html"
-        with open(arquivo_saida_html, "w", encoding="utf-8") as f:
-            f.write(conteudo_html)
-        
-        print(f"Arquivo HTML gerado: {arquivo_saida_html}")
-        
-        # Informa sobre anexos copiados
-        if args.standalone or (not args.servidor and args.pasta_midias and anexos_encontrados > 0):
-            pasta_anexos_criada = os.path.join(pasta_html_base, "anexos_conversa")
-            if os.path.exists(pasta_anexos_criada):
-                arquivos_copiados = len(os.listdir(pasta_anexos_criada))
-                print(f"Anexos copiados para: {pasta_anexos_criada}")
-                print(f"Total de {arquivos_copiados} arquivos copiados")
-
-        # Exporta CSV se solicitado
-        if args.exportar_csv:
-            arquivo_saida_csv = os.path.splitext(args.arquivo)[0] + "_conversa.csv"
-            gerador.exportar_csv(arquivo_saida_csv)
-            print(f"Arquivo CSV gerado: {arquivo_saida_csv}")
-
-        print(f"\nProcessamento concluÃ­do!")
-        
-        if args.servidor and httpd:
-            print(f"Abrindo navegador...")
-            webbrowser.open(f'http://localhost:{args.porta}/{os.path.basename(arquivo_saida_html)}')
-            print(f"\nINSTRUÃ‡Ã•ES:")
-            print(f"   â€¢ O navegador abrirÃ¡ automaticamente")
-            print(f"   â€¢ Os anexos agora funcionarÃ£o corretamente")
-            print(f"   â€¢ Para PARAR o servidor: pressione Ctrl+C")
-            print(f"   â€¢ URL: http://localhost:{args.porta}")
-            
-            try:
-                print(f"\nServidor rodando... (Ctrl+C para parar)")
-                httpd.serve_forever()
-            except KeyboardInterrupt:
-                print(f"\nServidor parado pelo usuÃ¡rio")
-                httpd.shutdown()
-        else:
-            if args.standalone or (args.pasta_midias and anexos_encontrados > 0):
-                print(f"\nCOMO USAR:")
-                print(f"   â€¢ Abra o arquivo HTML: {arquivo_saida_html}")
-                print(f"   â€¢ Imagens carregarÃ£o automaticamente")
-                print(f"   â€¢ PDFs e documentos: clique para baixar")
-                print(f"   â€¢ Anexos foram copiados para pasta local")
-                print(f"\nPara visualizaÃ§Ã£o completa de PDFs no navegador:")
-                print(f"   python {sys.argv[0]} {args.arquivo} --pasta-midias {args.pasta_midias or 'Anexos'} --servidor")
-            else:
-                print(f"DICAS:")
-                print(f"   â€¢ Modo standalone: --standalone")
-                print(f"   â€¢ Servidor completo: --servidor")
-        
-    except Exception as e:
-        print(f"Erro durante o processamento: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
-
-if __name__ == "__main__":
+import re
+import os
+import sys
+import csv
+import argparse
+import html
+import codecs
+import io
+import contextlib
+import unicodedata
+import webbrowser
+import threading
+import time
+import shutil
+import hashlib
+import functools
+import atexit
+import tracemalloc
+import json
+import zipfile
+import zlib
+import tempfile
+import itertools
+import collections
+import concurrent.futures
+from datetime import datetime, date
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import unquote, quote
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele, não há miniaturas
+    Image = ImageOps = None
+
+def limpar_nome_arquivo(nome):
+    """Remove caracteres invisÃ­veis e normaliza o nome do arquivo"""
+    if not nome:
+        return ""
+    
+    nome = unicodedata.normalize('NFKC', nome)
+    # Remove caracteres invisÃ­veis comuns do WhatsApp
+    for ch in ['\u200e', '\u200f', '\ufeff', '\xa0', 'â€Ž']:
+        nome = nome.replace(ch, '')
+    
+    # Remove caracteres de controle Unicode
+    nome = ''.join(c for c in nome if not unicodedata.category(c).startswith('C'))
+    return nome.strip()
+
+# Marcas de direção e BOM são removidas e o espaço não-quebrável vira espaço
+# comum, tudo em uma única chamada a str.translate
+TABELA_LIMPEZA_LINHA = str.maketrans({'\u200e': None, '\u200f': None, '\ufeff': None, '\xa0': ' '})
+
+def _normalizar_espacos(linha):
+    """Equivale a ' '.join(linha.split()), mas evita o trabalho se já estiver normalizada"""
+    # isprintable() é falso para qualquer espaço em branco que não seja ' '
+    if linha.isprintable() and '  ' not in linha and linha[0] != ' ' and linha[-1] != ' ':
+        return linha
+    return ' '.join(linha.split())
+
+def limpar_linha(linha):
+    """Remove caracteres invisÃ­veis e normaliza a linha para processamento"""
+    if not linha:
+        return ""
+    
+    # Caminho rápido: linhas ASCII não têm marcas invisíveis, sequências mal
+    # codificadas nem caracteres afetados pela normalização NFKC
+    if linha.isascii():
+        return _normalizar_espacos(linha)
+
+    # Remove caracteres de direção de texto e troca espaços não-breaking
+    linha = linha.translate(TABELA_LIMPEZA_LINHA)
+    # Remove sequências mal codificadas comuns
+    if 'â€' in linha:
+        linha = linha.replace('â€Ž', '')
+        linha = linha.replace('â€', '')
+    # Normaliza Unicode
+    if not unicodedata.is_normalized('NFKC', linha):
+        linha = unicodedata.normalize('NFKC', linha)
+    if not linha:
+        return ""
+    # Normaliza espaços múltiplos
+    return _normalizar_espacos(linha)
+
+def remover_marcas_anexo(texto_limpo):
+    """
+    Remove as marcas <anexado: ...> de um texto que já passou por limpar_linha.
+    Sem marcas, o texto já está limpo e é devolvido sem nova normalização.
+    """
+    if '<anexado:' not in texto_limpo:
+        return texto_limpo
+    return limpar_linha(re.sub(r'<anexado:[^>]*>', '', texto_limpo))
+
+# Padrão único para os cabeçalhos de mensagem, testado uma vez por linha:
+#   [DD/MM/AAAA, HH:MM:SS] Usuario: texto   (colchetes)
+#   DD/MM/AAAA HH:MM - Usuario: texto       (hífen)
+#   DD/MM/AAAA HH:MM - Mensagem do sistema  (hífen sem usuário)
+REGEX_CABECALHO = re.compile(
+    r'^(?:\[(\d{1,2}/\d{1,2}/\d{4}),\s*(\d{1,2}:\d{2}:\d{2})\]\s*([^:]*?):\s*(.*)'
+    r'|(\d{2}/\d{2}/\d{4})\s+(\d{2}:\d{2})\s*-(?:\s*([^:]+?):)?\s*(.*))$'
+)
+
+def reconhecer_cabecalho(linha_limpa):
+    """
+    Classifica uma linha já limpa. Retorna None para linhas de continuação ou
+    uma tupla (formato, data, hora, usuario, texto), onde formato é
+    "COLCHETES", "HÍFEN" ou "SISTEMA" (usuario é None neste último caso).
+    """
+    # Todo cabeçalho começa com '[' ou com um dígito da data
+    if not linha_limpa:
+        return None
+    primeiro = linha_limpa[0]
+    if primeiro != '[' and not ('0' <= primeiro <= '9'):
+        return None
+
+    match = REGEX_CABECALHO.match(linha_limpa)
+    if not match:
+        return None
+
+    data_c, hora_c, usuario_c, texto_c, data_h, hora_h, usuario_h, texto_h = match.groups()
+    if data_c is not None:
+        return ("COLCHETES", data_c, hora_c, usuario_c, texto_c)
+    if usuario_h is not None:
+        return ("HÍFEN", data_h, hora_h, usuario_h, texto_h)
+    return ("SISTEMA", data_h, hora_h, None, texto_h)
+
+def e_nova_mensagem(linha):
+    """Verifica se a linha corresponde ao início de uma nova mensagem"""
+    return reconhecer_cabecalho(limpar_linha(linha)) is not None
+
+# Classificação das mensagens por idioma da exportação: (tipo, palavras,
+# ignorar maiúsculas). Se o texto contiver palavras de mais de uma regra,
+# vale a que aparece primeiro na lista. Pode ser ampliada com --regras-tipo.
+REGRAS_TIPO = {
+    "pt": [
+        ("ligacao", ("Ligação", "ligação", "Ligacao"), False),
+        ("apagada", ("Mensagem apagada",), False),
+        ("audio_oculto", ("áudio ocultado", "audio ocultado"), False),
+        ("visualizacao_unica", ("visualização única",), True),
+        ("localizacao", ("localização:", "localização em tempo real", "maps.google.com/?q="), True),
+        ("contato", (".vcf", "cartão de contato"), True),
+        ("sistema", ("mudou o nome", "saiu", "foi adicionado", "removeu", "entrou"), True),
+    ],
+    "en": [
+        ("ligacao", ("Missed voice call", "Missed video call", "Voice call", "Video call"), False),
+        ("apagada", ("This message was deleted", "You deleted this message"), False),
+        ("audio_oculto", ("audio omitted",), False),
+        ("visualizacao_unica", ("view once",), True),
+        ("localizacao", ("location:", "live location shared", "maps.google.com/?q="), True),
+        ("contato", (".vcf", "contact card omitted"), True),
+        ("sistema", ("changed the subject", "changed this group's icon", "changed the group description",
+                     "joined using this group's invite link", "created group", " added ", " removed "), True),
+    ],
+    "es": [
+        ("ligacao", ("Llamada perdida", "Videollamada perdida", "Llamada de voz", "Videollamada"), False),
+        ("apagada", ("Se eliminó este mensaje", "Eliminaste este mensaje"), False),
+        ("audio_oculto", ("audio omitido",), False),
+        ("visualizacao_unica", ("ver una vez", "visualización única"), True),
+        ("localizacao", ("ubicación:", "ubicación en tiempo real", "maps.google.com/?q="), True),
+        ("contato", (".vcf", "tarjeta de contacto omitida"), True),
+        ("sistema", ("cambió el asunto", "cambió el ícono", "cambió la descripción",
+                     "se unió usando el enlace de invitación", "creó el grupo", " añadió a ", " eliminó a "), True),
+    ],
+}
+
+class ClassificadorTipos:
+    """
+    Classifica o texto de uma mensagem pelas regras de um idioma. Todas as
+    palavras são compiladas em dois padrões (um sensível e outro insensível
+    a maiúsculas), com um grupo por regra, em vez de um laço por regra e
+    por palavra em Python. A alternância não vira um autômato: em cada
+    posição do texto o módulo re tenta as palavras uma a uma, e a busca
+    custa proporcionalmente ao tamanho do texto vezes o número de palavras.
+    A maioria das mensagens não tem nenhuma palavra-chave e para nessa
+    única busca; só as demais passam pelo finditer com lookahead, que
+    localiza todas as ocorrências para escolher a primeira regra.
+    """
+    def __init__(self, regras):
+        self.tipos = [tipo for tipo, _, _ in regras]
+        self.exato = self._compilar([(i, palavras) for i, (_, palavras, ignorar) in enumerate(regras) if not ignorar])
+        self.minusculas = self._compilar([(i, [palavra.lower() for palavra in palavras])
+                                          for i, (_, palavras, ignorar) in enumerate(regras) if ignorar])
+
+    @staticmethod
+    def _compilar(regras):
+        """(padrão de busca, padrão com todas as ocorrências, regra de cada grupo), ou None sem palavras"""
+        regras = [(i, palavras) for i, palavras in regras if palavras]
+        if not regras:
+            return None
+        # Palavras mais longas primeiro, para que um prefixo não esconda a palavra inteira
+        grupos = '|'.join('(' + '|'.join(re.escape(palavra) for palavra in sorted(palavras, key=len, reverse=True)) + ')'
+                          for _, palavras in regras)
+        # O lookahead encontra também ocorrências sobrepostas a outras
+        return re.compile(grupos), re.compile(f'(?=(?:{grupos}))'), [i for i, _ in regras]
+
+    @staticmethod
+    def _melhor_regra(padroes, texto, melhor):
+        busca, todas, regra_do_grupo = padroes
+        if busca.search(texto) is None:
+            return melhor
+        for match in todas.finditer(texto):
+            regra = regra_do_grupo[match.lastindex - 1]
+            if melhor is None or regra < melhor:
+                melhor = regra
+        return melhor
+
+    def classificar(self, texto):
+        """Tipo da primeira regra com alguma palavra no texto, ou "mensagem" """
+        melhor = None
+        if self.exato:
+            melhor = self._melhor_regra(self.exato, texto, melhor)
+        if self.minusculas and melhor != 0:
+            melhor = self._melhor_regra(self.minusculas, texto.lower(), melhor)
+        return self.tipos[melhor] if melhor is not None else "mensagem"
+
+# Classificadores já compilados, por idioma
+_classificadores = {}
+
+def classificador_idioma(idioma):
+    """Classificador das regras do idioma (português, se não houver regras para ele)"""
+    classificador = _classificadores.get(idioma)
+    if classificador is None:
+        classificador = _classificadores[idioma] = ClassificadorTipos(REGRAS_TIPO.get(idioma, REGRAS_TIPO["pt"]))
+    return classificador
+
+def configurar_regras_tipo(regras):
+    """Substitui as regras dos idiomas presentes em 'regras' (mesma estrutura de REGRAS_TIPO)"""
+    global REGRAS_TIPO
+    REGRAS_TIPO = dict(REGRAS_TIPO, **{idioma: [(tipo, tuple(palavras), bool(ignorar)) for tipo, palavras, ignorar in lista]
+                                       for idioma, lista in regras.items()})
+    _classificadores.clear()
+
+def carregar_regras_tipo(arquivo_json):
+    """
+    Lê regras de classificação de um arquivo JSON, no formato
+    {"idioma": [{"tipo": ..., "palavras": [...], "ignorar_maiusculas": true}, ...]}.
+    Gera ValueError se o conteúdo não seguir esse formato.
+    """
+    with open(arquivo_json, encoding='utf-8') as f:
+        dados = json.load(f)
+    if not isinstance(dados, dict):
+        raise ValueError("o arquivo deve conter um objeto com uma lista de regras por idioma")
+
+    regras = {}
+    for idioma, lista in dados.items():
+        if not isinstance(lista, list):
+            raise ValueError(f"as regras do idioma '{idioma}' devem ser uma lista")
+        regras[idioma] = []
+        for regra in lista:
+            if not isinstance(regra, dict) or not isinstance(regra.get("tipo"), str) \
+                    or not isinstance(regra.get("palavras"), list):
+                raise ValueError(f"regra inválida no idioma '{idioma}': {regra!r}")
+            palavras = tuple(p for p in regra["palavras"] if isinstance(p, str) and p)
+            regras[idioma].append((regra["tipo"], palavras, bool(regra.get("ignorar_maiusculas", False))))
+    return regras
+
+class FormatoExportacao:
+    """
+    Layout de cabeçalho de uma exportação, detectado uma vez por arquivo
+    (veja detectar_formato). Cada linha é testada só contra o padrão deste
+    layout, em vez de todos os padrões conhecidos:
+      "COLCHETES": [data, hora] Usuario: texto      (iPhone)
+      "HÍFEN":     data hora - Usuario: texto       (Android)
+    A data pode vir como DD/MM, MM/DD ou AAAA/MM/DD, separada por '/', '.'
+    ou '-', com ano de 2 ou 4 dígitos; a hora, com ou sem segundos e em
+    24 ou 12 horas (AM/PM, a. m./p. m.).
+    """
+    def __init__(self, layout, ordem_data="DMA", separador="/", digitos_ano=4,
+                 com_segundos=False, doze_horas=False, idioma="pt"):
+        self.layout = layout
+        self.ordem_data = ordem_data
+        self.separador = separador
+        self.digitos_ano = digitos_ano
+        self.com_segundos = com_segundos
+        self.doze_horas = doze_horas
+        self.idioma = idioma
+
+        dia_mes = r'\d{1,2}'
+        ano = r'\d{%d}' % digitos_ano
+        sep = re.escape(separador)
+        if ordem_data == "AMD":
+            data = f'{ano}{sep}{dia_mes}{sep}{dia_mes}'
+        else:
+            data = f'{dia_mes}{sep}{dia_mes}{sep}{ano}'
+        hora = r'\d{1,2}:\d{2}' + (r':\d{2}' if com_segundos else '')
+        if doze_horas:
+            hora += r'\s*[AaPp]\.?\s*[Mm]\.?'
+
+        if layout == "COLCHETES":
+            self.regex = re.compile(rf'^\[({data}),\s*({hora})\]\s*([^:]*?):\s*(.*)$')
+        else:
+            self.regex = re.compile(rf'^({data})(?:,\s*|\s+)({hora})\s*-(?:\s*([^:]+?):)?\s*(.*)$')
+
+
+    def parametros(self):
+        """Parâmetros que recriam o formato (gravados no cache e enviados a outros processos)"""
+        return (self.layout, self.ordem_data, self.separador, self.digitos_ano,
+                self.com_segundos, self.doze_horas, self.idioma)
+
+    @property
+    def padrao_data(self):
+        ano = "A" * self.digitos_ano
+        partes = {"DMA": ("DD", "MM", ano), "MDA": ("MM", "DD", ano), "AMD": (ano, "MM", "DD")}[self.ordem_data]
+        return self.separador.join(partes)
+
+    @property
+    def nome(self):
+        """"COLCHETES" ou "HÍFEN"; variantes fora do padrão brasileiro levam a data e o relógio"""
+        if (self.ordem_data, self.separador, self.digitos_ano, self.doze_horas) == ("DMA", "/", 4, False):
+            return self.layout
+        return f"{self.layout} ({self.padrao_data}{', 12h' if self.doze_horas else ''})"
+
+    @property
+    def descricao(self):
+        hora = "HH:MM" + (":SS" if self.com_segundos else "") + (" AM/PM" if self.doze_horas else "")
+        if self.layout == "COLCHETES":
+            return f"[{self.padrao_data}, {hora}] Usuario: texto"
+        return f"{self.padrao_data} {hora} - Usuario: texto"
+
+    def reconhecer(self, linha_limpa):
+        """Como reconhecer_cabecalho, mas só para o layout detectado"""
+        if not linha_limpa:
+            return None
+        primeiro = linha_limpa[0]
+        if self.layout == "COLCHETES":
+            if primeiro != '[':
+                return None
+        elif not ('0' <= primeiro <= '9'):
+            return None
+
+        match = self.regex.match(linha_limpa)
+        if not match:
+            return None
+        data, hora, usuario, texto = match.groups()
+        if usuario is None and self.layout == "HÍFEN":
+            return ("SISTEMA", data, hora, None, texto)
+        return (self.layout, data, hora, usuario, texto)
+
+# Linhas iniciais examinadas para detectar o formato da exportação
+LINHAS_AMOSTRA_FORMATO = 5000
+
+# Padrão tolerante, usado só na amostra, que aceita qualquer variante de cabeçalho
+REGEX_AMOSTRA_CABECALHO = re.compile(
+    r'^(\[)?(\d{1,4})([./-])(\d{1,2})\3(\d{2,4}),?\s*\d{1,2}:\d{2}(:\d{2})?'
+    r'\s*([AaPp]\.?\s*[Mm]\.?)?\s*(\]|-)'
+)
+
+# Frases que só aparecem em exportações de cada idioma (aviso de criptografia,
+# mídia omitida, mensagens apagadas e chamadas)
+MARCADORES_IDIOMA = {
+    "pt": ("As mensagens e as chamadas são protegidas", "<Mídia oculta>", "Mensagem apagada",
+           "Ligação de voz", "Ligação de vídeo", "arquivo de mídia oculto", "imagem ocultada", "áudio ocultado"),
+    "en": ("Messages and calls are end-to-end encrypted", "<Media omitted>", "This message was deleted",
+           "You deleted this message", "Missed voice call", "Missed video call", "image omitted", "audio omitted"),
+    "es": ("Los mensajes y las llamadas están cifrados", "<Multimedia omitido>", "Se eliminó este mensaje",
+           "Eliminaste este mensaje", "Llamada perdida", "Videollamada perdida", "imagen omitida", "audio omitido"),
+}
+
+def detectar_idioma(textos, doze_horas_com_pontos=None):
+    """
+    Idioma da exportação pelas frases de MARCADORES_IDIOMA. Sem nenhuma
+    delas, o relógio de 12 horas sugere inglês (AM/PM) ou espanhol
+    (a. m./p. m.); no mais, português.
+    """
+    pontos = collections.Counter()
+    for texto in textos:
+        for idioma, marcadores in MARCADORES_IDIOMA.items():
+            for marcador in marcadores:
+                if marcador in texto:
+                    pontos[idioma] += 1
+    if pontos:
+        return pontos.most_common(1)[0][0]
+    if doze_horas_com_pontos is not None:
+        return "es" if doze_horas_com_pontos else "en"
+    return "pt"
+
+def detectar_formato(linhas):
+    """
+    Detecta o formato da exportação a partir das linhas da amostra (texto já
+    decodificado) e retorna um FormatoExportacao, ou None se nenhuma linha
+    parecer um cabeçalho. A ordem da data é decidida pelos valores: um
+    primeiro campo acima de 12 indica DD/MM; um segundo acima de 12, MM/DD.
+    Se todas as datas forem ambíguas, vale DD/MM, exceto com AM/PM sem
+    pontos (relógio americano), que indica MM/DD.
+    """
+    textos = []
+    layouts = collections.Counter()
+    separadores = collections.Counter()
+    digitos_ano = collections.Counter()
+    primeiro_maior_12 = segundo_maior_12 = ano_primeiro = False
+    com_segundos = sem_segundos = 0
+    doze_horas = None
+
+    for linha in linhas:
+        linha_limpa = limpar_linha(linha.strip())
+        if not linha_limpa:
+            continue
+        textos.append(linha_limpa)
+        match = REGEX_AMOSTRA_CABECALHO.match(linha_limpa)
+        if not match:
+            continue
+        colchete, campo1, separador, campo2, campo3, segundos, ampm, fecho = match.groups()
+        if bool(colchete) != (fecho == ']'):
+            continue
+        if len(campo1) == 4:
+            if len(campo3) > 2:
+                continue
+            ano_primeiro = True
+            digitos_ano[4] += 1
+        elif len(campo1) <= 2 and len(campo3) in (2, 4):
+            digitos_ano[len(campo3)] += 1
+            primeiro_maior_12 |= int(campo1) > 12
+            segundo_maior_12 |= int(campo2) > 12
+        else:
+            continue
+
+        layouts["COLCHETES" if colchete else "HÍFEN"] += 1
+        separadores[separador] += 1
+        if segundos:
+            com_segundos += 1
+        else:
+            sem_segundos += 1
+        if ampm:
+            doze_horas = '.' in ampm
+
+    if not layouts:
+        return None
+
+    if ano_primeiro:
+        ordem_data = "AMD"
+    elif primeiro_maior_12:
+        ordem_data = "DMA"
+    elif segundo_maior_12:
+        ordem_data = "MDA"
+    else:
+        ordem_data = "MDA" if doze_horas is False else "DMA"
+
+    exportacao = FormatoExportacao(
+        layouts.most_common(1)[0][0], ordem_data, separadores.most_common(1)[0][0],
+        digitos_ano.most_common(1)[0][0], com_segundos > sem_segundos, doze_horas is not None,
+        detectar_idioma(textos, doze_horas),
+    )
+    # Confere se o formato escolhido reconhece de fato as linhas da amostra
+    if not any(exportacao.reconhecer(texto) for texto in textos):
+        return None
+    return exportacao
+
+def detectar_formato_arquivo(arquivo_txt, encoding=None, linhas=LINHAS_AMOSTRA_FORMATO):
+    """Detecta o formato pelas primeiras 'linhas' linhas do arquivo"""
+    with contextlib.closing(ler_linhas(arquivo_txt, encoding)) as leitura:
+        return detectar_formato(itertools.islice(leitura, linhas))
+
+# Descrição dos formatos brasileiros, usada quando o formato não foi detectado
+DESCRICOES_FORMATO = {
+    "COLCHETES": "[DD/MM/AAAA, HH:MM:SS] Usuario: texto",
+    "HÍFEN": "DD/MM/AAAA HH:MM - Usuario: texto",
+}
+
+# Prefixo numérico que o WhatsApp põe em alguns nomes de mídia (00000006-)
+REGEX_PREFIXO_NUMERICO = re.compile(r'^\d+-')
+
+# Candidatos guardados por anexo resolvido de forma ambígua
+MAX_CANDIDATOS_AMBIGUOS = 5
+
+def trigramas(texto):
+    """Conjunto de trigramas de um nome, com as bordas marcadas"""
+    texto = f"\x00{texto}\x00"
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceMidias:
+    """
+    Índice dos arquivos de uma pasta de mídias, montado uma vez só. O nome
+    exato, o nome sem o prefixo numérico e o nome sem maiúsculas (casefold)
+    apontam direto para o caminho, e cada nome consultado é guardado, então
+    cada anexo citado custa uma busca em dicionário em vez de uma varredura
+    da pasta.
+
+    Para a busca aproximada, os nomes em minúsculas também são indexados por
+    trigramas: os candidatos saem da interseção das listas dos trigramas do
+    anexo, são ordenados por semelhança e, quando há mais de um, o anexo fica
+    registrado em 'ambiguos' com os melhores candidatos.
+    """
+    def __init__(self, arquivos):
+        # 'arquivos': pares (nome, caminho) na ordem da pasta; o primeiro vence
+        arquivos = list(arquivos)
+        self.exatos = {}
+        self.sem_prefixo = {}
+        self.sem_maiusculas = {}
+        self.nomes = []
+        self.por_nome = {}
+        self.trigramas = collections.defaultdict(list)
+        for nome, caminho in arquivos:
+            nome_sem_prefixo = REGEX_PREFIXO_NUMERICO.sub('', nome)
+            self.exatos.setdefault(nome, caminho)
+            self.sem_prefixo.setdefault(nome_sem_prefixo, caminho)
+            self.sem_maiusculas.setdefault(nome.casefold(), caminho)
+            posicao = len(self.nomes)
+            self.nomes.append((nome.lower(), caminho))
+            self.por_nome.setdefault(nome.lower(), []).append(posicao)
+            for trigrama in trigramas(nome.lower()):
+                self.trigramas[trigrama].append(posicao)
+        for nome, caminho in arquivos:
+            self.sem_maiusculas.setdefault(REGEX_PREFIXO_NUMERICO.sub('', nome).casefold(), caminho)
+        self._consultas = {}
+        # Anexo -> (quantidade de candidatos, melhores candidatos em ordem)
+        self.ambiguos = {}
+
+    @classmethod
+    def da_pasta(cls, pasta):
+        """Lista a pasta com os.scandir (o tipo de cada entrada vem junto, sem um stat por arquivo)"""
+        with os.scandir(pasta) as entradas:
+            return cls([(entrada.name, entrada.path) for entrada in entradas if entrada.is_file()])
+
+    def __len__(self):
+        return len(self.exatos)
+
+    def localizar(self, nome_arquivo):
+        """
+        Tenta, nesta ordem: o nome exato; o nome sem prefixo numérico; um
+        arquivo que, sem o prefixo, tenha esse nome; o mesmo sem maiúsculas;
+        e por fim um arquivo cujo nome contenha o do anexo ou esteja contido nele.
+        """
+        caminho = self.exatos.get(nome_arquivo)
+        if caminho is not None:
+            return caminho
+        if nome_arquivo in self._consultas:
+            return self._consultas[nome_arquivo]
+
+        nome_sem_prefixo = REGEX_PREFIXO_NUMERICO.sub('', nome_arquivo)
+        caminho = (self.exatos.get(nome_sem_prefixo)
+                   or self.sem_prefixo.get(nome_sem_prefixo)
+                   or self.sem_maiusculas.get(nome_sem_prefixo.casefold()))
+        if caminho is None:
+            candidatos = self.candidatos(nome_sem_prefixo.lower())
+            if candidatos:
+                caminho = candidatos[0]
+                if len(candidatos) > 1:
+                    self.ambiguos[nome_arquivo] = (len(candidatos), candidatos[:MAX_CANDIDATOS_AMBIGUOS])
+
+        self._consultas[nome_arquivo] = caminho
+        return caminho
+
+    def candidatos(self, nome_base):
+        """
+        Arquivos cujo nome (em minúsculas) contém 'nome_base' ou está contido
+        nele, do mais para o menos parecido (semelhança de trigramas; no
+        empate, a ordem da pasta).
+        """
+        posicoes = set()
+
+        # Nomes que contêm o do anexo têm todos os seus trigramas internos
+        internos = [texto for texto in trigramas(nome_base) if '\x00' not in texto]
+        if internos:
+            listas = sorted((self.trigramas.get(texto, ()) for texto in internos), key=len)
+            encontrados = set(listas[0])
+            for lista in listas[1:]:
+                if not encontrados:
+                    break
+                encontrados.intersection_update(lista)
+            posicoes.update(p for p in encontrados if nome_base in self.nomes[p][0])
+        else:
+            # Nome curto demais para trigramas: varredura simples
+            posicoes.update(p for p, (nome, _) in enumerate(self.nomes) if nome_base in nome)
+
+        # Nomes contidos no do anexo são trechos dele
+        tamanho = len(nome_base)
+        for inicio in range(tamanho):
+            for fim in range(inicio + 1, tamanho + 1):
+                posicoes.update(self.por_nome.get(nome_base[inicio:fim], ()))
+
+        if not posicoes:
+            return []
+        referencia = trigramas(nome_base)
+
+        def semelhanca(posicao):
+            outros = trigramas(self.nomes[posicao][0])
+            return len(referencia & outros) / len(referencia | outros)
+
+        ordem = sorted(posicoes, key=lambda p: (-semelhanca(p), p))
+        return [self.nomes[p][1] for p in ordem]
+
+# Índices das pastas de mídias já listadas: pasta -> (modificação da pasta, índice)
+_indices_midias = {}
+
+def indice_midias(pasta_midias):
+    """
+    Índice da pasta de mídias, montado na primeira consulta e refeito só se a
+    pasta mudar. Retorna None se a pasta não existir.
+    """
+    # 'pasta' e 'pasta/' são a mesma pasta e geram os mesmos caminhos
+    pasta_midias = os.path.join(pasta_midias, '')
+    try:
+        modificacao = os.stat(pasta_midias).st_mtime_ns
+    except OSError:
+        return None
+    guardado = _indices_midias.get(pasta_midias)
+    if guardado is None or guardado[0] != modificacao:
+        try:
+            guardado = (modificacao, IndiceMidias.da_pasta(pasta_midias))
+        except OSError:
+            return None
+        _indices_midias[pasta_midias] = guardado
+    return guardado[1]
+
+class MidiasZip:
+    """
+    Mídias de uma exportação .zip, lidas direto do arquivo compactado. Os
+    membros são indexados pelo nome (sem as pastas internas) e só são
+    extraídos quando algum deles precisa ser copiado. O .zip fica aberto até
+    fechar() (ou o fim do bloco with) e é reaberto se for usado de novo.
+    """
+    def __init__(self, arquivo_zip):
+        self.arquivo_zip = arquivo_zip
+        self._zip = None
+        self.membros = {}
+        for info in self.zip.infolist():
+            if not info.is_dir():
+                self.membros.setdefault(os.path.basename(info.filename), info)
+        self.indice = IndiceMidias((nome, nome) for nome in self.membros)
+
+    def __str__(self):
+        return self.arquivo_zip
+
+    def __len__(self):
+        return len(self.membros)
+
+    @property
+    def zip(self):
+        # Aberto sob demanda e mantido aberto: o índice central é lido uma vez só
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.arquivo_zip)
+        return self._zip
+
+    def fechar(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+    def localizar(self, nome_arquivo):
+        """Mesmas tentativas de verificar_arquivo_existe, sobre os nomes dos membros"""
+        return self.indice.localizar(nome_arquivo)
+
+    def abrir(self, nome):
+        """Abre o membro para leitura em modo binário, sem extraí-lo"""
+        return self.zip.open(self.membros[nome])
+
+    def extrair(self, nome, destino):
+        """Copia o membro para 'destino', preservando a data de modificação gravada no .zip"""
+        with self.abrir(nome) as origem, open(destino, 'wb') as f:
+            shutil.copyfileobj(origem, f, 1024 * 1024)
+        modificacao = time.mktime(self.membros[nome].date_time + (0, 0, -1))
+        os.utime(destino, (modificacao, modificacao))
+
+def abrir_midias(pasta_midias):
+    """Uma pasta de mídias que seja um arquivo .zip é lida pelo índice dos seus membros"""
+    if isinstance(pasta_midias, str) and e_arquivo_zip(pasta_midias):
+        return MidiasZip(pasta_midias)
+    return pasta_midias
+
+def verificar_arquivo_existe(nome_arquivo, pasta_midias):
+    """Verifica se o arquivo existe, testando diferentes possibilidades"""
+    if not pasta_midias or not nome_arquivo:
+        return None
+
+    if isinstance(pasta_midias, MidiasZip):
+        return pasta_midias.localizar(nome_arquivo)
+
+    # Nome exato, sem prefixos numéricos (00000006- etc), sem maiúsculas ou
+    # por padrão similar, tudo pelo índice da pasta, listada uma vez só
+    indice = indice_midias(pasta_midias)
+    if indice is None:
+        return None
+    return indice.localizar(nome_arquivo)
+
+def anexo_ambiguo(nome_arquivo, pasta_midias):
+    """
+    Se o anexo foi resolvido por semelhança entre vários arquivos, retorna
+    (quantidade de candidatos, melhores candidatos); senão None.
+    """
+    if isinstance(pasta_midias, MidiasZip):
+        indice = pasta_midias.indice
+    elif pasta_midias:
+        indice = indice_midias(pasta_midias)
+    else:
+        return None
+    return indice.ambiguos.get(nome_arquivo) if indice else None
+
+def gerar_aviso_ambiguo(anexo):
+    """Aviso exibido junto do anexo (AnexoResolvido) resolvido entre vários candidatos"""
+    if not anexo.candidatos:
+        return ''
+    quantidade, candidatos = anexo.candidatos
+    nomes = ", ".join(html.escape(os.path.basename(candidato)) for candidato in candidatos)
+    return (f'<div style="color:#8a6d00;font-size:85%;background:#fff8e1;padding:2px 6px;border-radius:3px;">'
+            f'Atenção: "{html.escape(anexo.nome)}" não foi encontrado com o nome exato; usado o mais parecido '
+            f'entre {quantidade} candidatos ({nomes})</div>')
+
+class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, pasta_anexos=None, **kwargs):
+        self.pasta_anexos = pasta_anexos
+        super().__init__(*args, **kwargs)
+    
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        
+        if path.startswith('/anexos/'):
+            nome_arquivo = unquote(path[8:])  # Remove '/anexos/'
+            if self.pasta_anexos:
+                if isinstance(self.pasta_anexos, MidiasZip):
+                    # Anexos servidos direto do .zip da exportação
+                    arquivo_real = nome_arquivo if nome_arquivo in self.pasta_anexos.membros else None
+                    abrir = self.pasta_anexos.abrir
+                else:
+                    arquivo_real = os.path.join(self.pasta_anexos, nome_arquivo)
+                    if not os.path.isfile(arquivo_real):
+                        arquivo_real = None
+                    abrir = lambda caminho: open(caminho, 'rb')
+                if arquivo_real:
+                    with abrir(arquivo_real) as f:
+                        self.send_response(200)
+                        
+                        # Define Content-Type baseado na extensÃ£o
+                        if nome_arquivo.lower().endswith('.pdf'):
+                            self.send_header('Content-Type', 'application/pdf')
+                        elif nome_arquivo.lower().endswith(('.jpg', '.jpeg')):
+                            self.send_header('Content-Type', 'image/jpeg')
+                        elif nome_arquivo.lower().endswith('.png'):
+                            self.send_header('Content-Type', 'image/png')
+                        else:
+                            self.send_header('Content-Type', 'application/octet-stream')
+                        
+                        self.send_header('Content-Disposition', f'inline; filename="{nome_arquivo}"')
+                        self.end_headers()
+                        
+                        shutil.copyfileobj(f, self.wfile)
+                    return
+        
+        super().do_GET()
+
+def criar_servidor_temporario(pasta_anexos, porta=8000):
+    """Cria um servidor HTTP temporÃ¡rio para servir os arquivos"""
+    def handler(*args, **kwargs):
+        return CustomHTTPRequestHandler(*args, pasta_anexos=pasta_anexos, **kwargs)
+    
+    httpd = HTTPServer(('localhost', porta), handler)
+    return httpd
+
+def iniciar_servidor_background(pasta_anexos, porta=8000):
+    """Inicia servidor em background"""
+    httpd = criar_servidor_temporario(pasta_anexos, porta)
+    
+    def servidor_thread():
+        print(f"Servidor local iniciado em http://localhost:{porta}")
+        print("Mantenha este terminal aberto enquanto visualiza os anexos")
+        httpd.serve_forever()
+    
+    thread = threading.Thread(target=servidor_thread, daemon=True)
+    thread.start()
+    return httpd
+
+# ioctl do Linux que clona um arquivo (reflink): o destino compartilha os
+# blocos da origem até ser modificado (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+TAMANHO_BLOCO_COPIA = 1024 * 1024
+
+# Threads que copiam os anexos enquanto o HTML é montado
+THREADS_MATERIALIZACAO = 8
+
+# Falhas ao ler um anexo: do disco ou de um membro corrompido do .zip (CRC inválido etc.)
+ERROS_LEITURA_ANEXO = (OSError, zipfile.BadZipFile, zlib.error)
+
+def clonar_arquivo(f_origem, f_destino):
+    """Clona a origem no destino (arquivos abertos); False se o sistema de arquivos não permitir"""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(f_destino.fileno(), FICLONE, f_origem.fileno())
+        return True
+    except OSError:
+        return False
+
+def copiar_em_blocos(f_origem, f_destino, progresso=None):
+    """Cópia em blocos de TAMANHO_BLOCO_COPIA, informando cada bloco a 'progresso'"""
+    while True:
+        bloco = f_origem.read(TAMANHO_BLOCO_COPIA)
+        if not bloco:
+            break
+        f_destino.write(bloco)
+        if progresso:
+            progresso(len(bloco))
+
+def copiar_anexo(caminho_arquivo, destino_arquivo, pasta_midias, vincular=False, progresso=None):
+    """
+    Coloca o anexo na pasta local e retorna como: "extraído" (membro de uma
+    exportação .zip), "vinculado" (link físico, só com 'vincular'),
+    "clonado" (reflink) ou "copiado" (cópia em blocos). Link e clone só
+    funcionam no mesmo sistema de arquivos; fora dele, a cópia é o recurso.
+    """
+    if isinstance(pasta_midias, MidiasZip):
+        pasta_midias.extrair(caminho_arquivo, destino_arquivo)
+        metodo = "extraído"
+    else:
+        metodo = None
+        if vincular:
+            try:
+                os.link(caminho_arquivo, destino_arquivo)
+                metodo = "vinculado"
+            except OSError:
+                pass
+        if metodo is None:
+            with open(caminho_arquivo, 'rb') as f_origem, open(destino_arquivo, 'wb') as f_destino:
+                if clonar_arquivo(f_origem, f_destino):
+                    metodo = "clonado"
+                else:
+                    copiar_em_blocos(f_origem, f_destino, progresso)
+                    metodo = "copiado"
+            shutil.copystat(caminho_arquivo, destino_arquivo)
+    if progresso and metodo != "copiado":
+        progresso(os.path.getsize(destino_arquivo))
+    return metodo
+
+def hash_conteudo_anexo(caminho_arquivo, pasta_midias, algoritmo='sha256'):
+    """Hash do conteúdo do anexo, lido em blocos (do disco ou do membro do .zip)"""
+    if not isinstance(pasta_midias, MidiasZip):
+        return calcular_hash_arquivo(caminho_arquivo, algoritmo, TAMANHO_BLOCO_COPIA)
+    h = hashlib.new(algoritmo)
+    with pasta_midias.abrir(caminho_arquivo) as f:
+        while True:
+            bloco = f.read(TAMANHO_BLOCO_COPIA)
+            if not bloco:
+                break
+            h.update(bloco)
+    return h.hexdigest()
+
+class MaterializadorAnexos:
+    """
+    Etapa que coloca os anexos em anexos_conversa/ (modo standalone ou cópia
+    local). As cópias são agendadas quando cada anexo é resolvido e rodam em
+    um pool de threads, enquanto a montagem do HTML continua; concluir()
+    espera as pendentes e retorna o resumo. Cada arquivo é gravado com um
+    nome temporário e renomeado no fim, então uma cópia interrompida não
+    passa por completa na próxima execução.
+    """
+    # Com --profile, as cópias rodam uma a uma em concluir(), na thread que
+    # chama: o pico de memória (tracemalloc) é do processo inteiro, e cópias
+    # em paralelo inflariam o pico das etapas medidas ao mesmo tempo
+    sequencial = False
+
+    def __init__(self, pasta_midias, vincular=False, threads=THREADS_MATERIALIZACAO):
+        self.pasta_midias = pasta_midias
+        self.vincular = vincular
+        self.threads = threads
+        self._executor = None
+        self._futuros = []
+        self._adiadas = []
+        self._trava = threading.Lock()
+        self.inicio = None
+        self.arquivos = 0
+        self.bytes = 0
+        self.metodos = collections.Counter()
+        self.erros = []
+        # Anexos que apontam para a cópia de outro de conteúdo idêntico
+        self.duplicados = 0
+        self.bytes_evitados = 0
+
+    def agendar(self, caminho_arquivo, destino_arquivo):
+        if self.sequencial:
+            self._adiadas.append((caminho_arquivo, destino_arquivo))
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+            self.inicio = time.perf_counter()
+        self._futuros.append(self._executor.submit(self._materializar, caminho_arquivo, destino_arquivo))
+
+    def registrar_duplicado(self, tamanho):
+        """Conta um anexo que não foi copiado por ter o mesmo conteúdo de outro"""
+        self.duplicados += 1
+        self.bytes_evitados += tamanho
+
+    def _somar_bytes(self, quantidade):
+        with self._trava:
+            self.bytes += quantidade
+
+    def _materializar(self, caminho_arquivo, destino_arquivo):
+        parcial = destino_arquivo + ".parcial"
+        try:
+            if os.path.lexists(parcial):
+                os.remove(parcial)
+            metodo = copiar_anexo(caminho_arquivo, parcial, self.pasta_midias, self.vincular, self._somar_bytes)
+            os.replace(parcial, destino_arquivo)
+        except ERROS_LEITURA_ANEXO as e:
+            if os.path.lexists(parcial):
+                os.remove(parcial)
+            with self._trava:
+                self.erros.append((str(caminho_arquivo), str(e)))
+            return
+        with self._trava:
+            self.arquivos += 1
+            self.metodos[metodo] += 1
+
+    def concluir(self, verboso=False):
+        """Espera as cópias pendentes (mostrando o progresso se 'verboso') e retorna o resumo"""
+        if self._adiadas:
+            self.inicio = time.perf_counter()
+            for concluidos, (caminho_arquivo, destino_arquivo) in enumerate(self._adiadas, 1):
+                self._materializar(caminho_arquivo, destino_arquivo)
+                if verboso:
+                    print(f"\rMaterializando anexos: {concluidos}/{len(self._adiadas)} ({self.bytes / 1024 / 1024:.1f} MB)",
+                          end="" if concluidos < len(self._adiadas) else "\n", flush=True)
+            self._adiadas = []
+        if self._executor is not None:
+            total = len(self._futuros)
+            for concluidos, futuro in enumerate(concurrent.futures.as_completed(self._futuros), 1):
+                # As falhas de leitura já foram registradas; qualquer outra exceção sobe daqui
+                futuro.result()
+                if verboso:
+                    print(f"\rMaterializando anexos: {concluidos}/{total} ({self.bytes / 1024 / 1024:.1f} MB)",
+                          end="" if concluidos < total else "\n", flush=True)
+            self._executor.shutdown()
+            self._executor = None
+            self._futuros = []
+        return {
+            "arquivos": self.arquivos,
+            "bytes": self.bytes,
+            "metodos": dict(self.metodos),
+            "erros": list(self.erros),
+            "duplicados": self.duplicados,
+            "bytes_evitados": self.bytes_evitados,
+            "segundos": time.perf_counter() - self.inicio if self.inicio is not None else 0.0,
+        }
+
+# Miniaturas das imagens (--miniaturas): maior lado em pixels (o HTML exibe
+# as imagens em até 400x300), qualidade do JPEG e pasta dentro de anexos_conversa/
+LADO_MINIATURA = 400
+QUALIDADE_MINIATURA = 80
+PASTA_MINIATURAS = "miniaturas"
+
+# .zip das mídias aberto por cada processo do pool de miniaturas
+_zips_miniaturas = {}
+
+def gerar_miniatura(origem, destino, lado=LADO_MINIATURA, arquivo_zip=None):
+    """
+    Gera em 'destino' a miniatura JPEG da imagem 'origem' (arquivo ou membro
+    de 'arquivo_zip'), com o maior lado em 'lado' pixels. Roda no pool de
+    processos. A imagem é lida direto do arquivo (ou do membro do .zip), sem
+    ser carregada inteira na memória.
+    """
+    if arquivo_zip:
+        if arquivo_zip not in _zips_miniaturas:
+            _zips_miniaturas[arquivo_zip] = zipfile.ZipFile(arquivo_zip)
+        abrir = lambda: _zips_miniaturas[arquivo_zip].open(origem)
+    else:
+        abrir = lambda: open(origem, 'rb')
+
+    parcial = f"{destino}.{os.getpid()}.parcial"
+    with abrir() as f, Image.open(f) as imagem:
+        # Em JPEG, já decodifica numa escala reduzida (bem mais rápido)
+        imagem.draft("RGB", (lado, lado))
+        miniatura = ImageOps.exif_transpose(imagem)
+        miniatura.thumbnail((lado, lado))
+        if miniatura.mode != "RGB":
+            # Transparência vira fundo branco
+            fundo = Image.new("RGB", miniatura.size, "white")
+            miniatura = miniatura.convert("RGBA")
+            fundo.paste(miniatura, mask=miniatura.getchannel("A"))
+            miniatura = fundo
+        miniatura.save(parcial, "JPEG", quality=QUALIDADE_MINIATURA, optimize=True)
+    os.replace(parcial, destino)
+
+class GeradorMiniaturas:
+    """
+    Etapa de miniaturas das imagens copiadas para anexos_conversa/: cada
+    imagem é agendada quando resolvida e reduzida num pool de processos,
+    enquanto a montagem do HTML continua; o <img> exibe a miniatura e o
+    clique abre o original. concluir() espera as pendentes e retorna o
+    resumo. Uma imagem que não puder ser reduzida fica sem miniatura, e o
+    HTML volta para o original.
+
+    O nome da miniatura leva uma chave do tamanho e da data de modificação
+    da imagem (no .zip, do tamanho, CRC e data do membro) e do lado: uma
+    miniatura já gerada só é reaproveitada se a imagem não mudou.
+    """
+    def __init__(self, pasta_midias, pasta_anexos_local, lado=LADO_MINIATURA, processos=None):
+        self.pasta_midias = pasta_midias
+        self.pasta = os.path.join(pasta_anexos_local, PASTA_MINIATURAS)
+        self.lado = lado
+        self.processos = processos
+        self._executor = None
+        self._futuros = {}
+        self._destinos = set()
+        self.inicio = None
+        self.existentes = 0
+
+    def _chave(self, caminho_arquivo):
+        """Chave curta da versão da imagem e do lado da miniatura"""
+        if isinstance(self.pasta_midias, MidiasZip):
+            info = self.pasta_midias.membros[caminho_arquivo]
+            versao = (info.file_size, info.CRC, info.date_time)
+        else:
+            estado = os.stat(caminho_arquivo)
+            versao = (estado.st_size, estado.st_mtime_ns)
+        return hashlib.sha256(repr((versao, self.lado)).encode('ascii')).hexdigest()[:16]
+
+    def agendar(self, caminho_arquivo):
+        """Agenda a miniatura da imagem e retorna o endereço dela no HTML (None se a imagem sumiu)"""
+        try:
+            chave = self._chave(caminho_arquivo)
+        except OSError:
+            return None
+        nome_miniatura = f"{os.path.basename(caminho_arquivo)}.{chave}.jpg"
+        destino = os.path.join(self.pasta, nome_miniatura)
+        if destino not in self._destinos:
+            self._destinos.add(destino)
+            if os.path.exists(destino):
+                self.existentes += 1
+            else:
+                if self._executor is None:
+                    os.makedirs(self.pasta, exist_ok=True)
+                    self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.processos)
+                    self.inicio = time.perf_counter()
+                if isinstance(self.pasta_midias, MidiasZip):
+                    origem = self.pasta_midias.membros[caminho_arquivo].filename
+                    arquivo_zip = self.pasta_midias.arquivo_zip
+                else:
+                    origem, arquivo_zip = caminho_arquivo, None
+                futuro = self._executor.submit(gerar_miniatura, origem, destino, self.lado, arquivo_zip)
+                self._futuros[futuro] = caminho_arquivo
+        return f"anexos_conversa/{PASTA_MINIATURAS}/{nome_miniatura}"
+
+    def concluir(self, verboso=False):
+        """Espera as miniaturas pendentes (mostrando o progresso se 'verboso') e retorna o resumo"""
+        geradas = 0
+        erros = []
+        if self._executor is not None:
+            total = len(self._futuros)
+            for concluidos, futuro in enumerate(concurrent.futures.as_completed(self._futuros), 1):
+                try:
+                    futuro.result()
+                    geradas += 1
+                except Exception as e:
+                    # Imagem corrompida ou em formato que o Pillow não lê
+                    erros.append((str(self._futuros[futuro]), str(e)))
+                if verboso:
+                    print(f"\rGerando miniaturas: {concluidos}/{total}",
+                          end="" if concluidos < total else "\n", flush=True)
+            self._executor.shutdown()
+            self._executor = None
+            self._futuros = {}
+        return {
+            "geradas": geradas,
+            "do_cache": self.existentes,
+            "erros": erros,
+            "segundos": time.perf_counter() - self.inicio if self.inicio is not None else 0.0,
+        }
+
+# Tipo de mídia pela extensão; as demais são tratadas como arquivo para baixar
+TIPOS_MIDIA = {
+    **dict.fromkeys(('jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp'), "imagem"),
+    'pdf': "pdf",
+    **dict.fromkeys(('mp4', 'mov', 'avi', 'mkv', 'webm'), "video"),
+    **dict.fromkeys(('mp3', 'wav', 'ogg', 'm4a', 'aac'), "audio"),
+}
+
+STATUS_ENCONTRADO = "ENCONTRADO"
+STATUS_NAO_ENCONTRADO = "NÃO ENCONTRADO"
+STATUS_AMBIGUO = "AMBÍGUO"
+
+class AnexoResolvido:
+    """
+    Resultado da localização de um nome de anexo: caminho (ou membro do .zip),
+    tamanho, tipo de mídia, situação, endereço usado no HTML (e o da
+    miniatura, nas imagens) e quantas vezes o nome aparece na conversa. O
+    HTML do anexo é montado uma vez e reutilizado.
+    """
+    __slots__ = ("nome", "caminho", "tamanho", "tipo", "status", "candidatos", "url", "ocorrencias", "html",
+                 "duplicata_de", "miniatura")
+
+    def __init__(self, nome, caminho=None, tamanho=None, tipo="", status=STATUS_NAO_ENCONTRADO,
+                 candidatos=None, url=""):
+        self.nome = nome
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.tipo = tipo
+        self.status = status
+        # (quantidade, melhores candidatos) quando resolvido por semelhança entre vários arquivos
+        self.candidatos = candidatos
+        self.url = url
+        self.ocorrencias = 0
+        self.html = None
+        # Caminho do anexo de conteúdo idêntico cuja cópia este reutiliza
+        self.duplicata_de = None
+        # Endereço da miniatura exibida no lugar da imagem ('' sem miniatura)
+        self.miniatura = ""
+
+    @property
+    def nome_arquivo(self):
+        return os.path.basename(self.caminho) if self.caminho else ""
+
+    @property
+    def extensao(self):
+        nome_arquivo = self.nome_arquivo
+        return nome_arquivo.lower().split('.')[-1] if '.' in nome_arquivo else ''
+
+    def __repr__(self):
+        return f"AnexoResolvido(nome={self.nome!r}, caminho={self.caminho!r}, status={self.status!r})"
+
+class TabelaAnexos:
+    """
+    Tabela de resolução dos anexos de uma conversa: cada nome distinto é
+    localizado, medido e (no modo de cópia local) agendado para cópia uma
+    única vez, não importa quantas mensagens o citem. O resumo, o HTML, a
+    cópia e o CSV de anexos leem desta tabela.
+
+    Com 'deduplicar', conteúdos idênticos com nomes diferentes (mídia
+    encaminhada várias vezes) são copiados uma vez só, e todos apontam para
+    essa cópia. Só anexos do mesmo tamanho (e, no .zip, do mesmo CRC) têm o
+    conteúdo comparado por hash, e cada arquivo é lido no máximo uma vez.
+
+    Com 'miniaturas' (e o Pillow instalado), cada imagem copiada ganha uma
+    miniatura, gerada em paralelo pelo GeradorMiniaturas. 'carregamento_lento'
+    é repassado a gerar_html_anexo.
+    """
+    def __init__(self, pasta_midias="", usar_servidor=False, porta=8000, pasta_html="", vincular_anexos=False,
+                 deduplicar=False, miniaturas=False, carregamento_lento=True):
+        self.pasta_midias = pasta_midias
+        self.usar_servidor = usar_servidor
+        self.porta = porta
+        self.pasta_html = pasta_html
+        # Nome -> AnexoResolvido, na ordem em que os nomes aparecem
+        self.anexos = {}
+        self._pasta_anexos_local = None
+        # Cópias para a pasta local, feitas em paralelo à montagem do HTML
+        self.materializador = MaterializadorAnexos(pasta_midias, vincular_anexos)
+        self._destinos = set()
+        self.deduplicar = deduplicar
+        # Anexos copiados por tamanho (ou tamanho e CRC) e SHA-256 de cada caminho já lido
+        self._por_tamanho = {}
+        self.hashes = {}
+        self.miniaturas = miniaturas and Image is not None
+        self.gerador_miniaturas = None
+        self.carregamento_lento = carregamento_lento
+
+    def __len__(self):
+        return len(self.anexos)
+
+    def __iter__(self):
+        return iter(self.anexos.values())
+
+    def registrar(self, nome):
+        """Conta mais uma ocorrência do anexo, resolvendo-o na primeira vez"""
+        anexo = self.resolver(nome)
+        anexo.ocorrencias += 1
+        return anexo
+
+    def resolver(self, nome):
+        anexo = self.anexos.get(nome)
+        if anexo is None:
+            anexo = self.anexos[nome] = self._resolver(nome)
+        return anexo
+
+    def _resolver(self, nome):
+        caminho_arquivo = verificar_arquivo_existe(nome, self.pasta_midias)
+        if not caminho_arquivo:
+            return AnexoResolvido(nome)
+
+        candidatos = anexo_ambiguo(nome, self.pasta_midias)
+        anexo = AnexoResolvido(nome, caminho_arquivo, status=STATUS_AMBIGUO if candidatos else STATUS_ENCONTRADO,
+                               candidatos=candidatos)
+        anexo.tipo = TIPOS_MIDIA.get(anexo.extensao, "arquivo")
+        if isinstance(self.pasta_midias, MidiasZip):
+            anexo.tamanho = self.pasta_midias.membros[caminho_arquivo].file_size
+        else:
+            try:
+                anexo.tamanho = os.path.getsize(caminho_arquivo)
+            except OSError:
+                pass
+
+        nome_arquivo = anexo.nome_arquivo
+        if self.usar_servidor:
+            anexo.url = f"http://localhost:{self.porta}/anexos/{nome_arquivo}"
+        elif self.pasta_html:
+            if self._pasta_anexos_local is None:
+                self._pasta_anexos_local = os.path.join(self.pasta_html, "anexos_conversa")
+                os.makedirs(self._pasta_anexos_local, exist_ok=True)
+                if self.miniaturas:
+                    self.gerador_miniaturas = GeradorMiniaturas(self.pasta_midias, self._pasta_anexos_local)
+            original = self._conteudo_identico(anexo) if self.deduplicar else None
+            if original is not None:
+                anexo.url = original.url
+                anexo.miniatura = original.miniatura
+                if original.caminho != caminho_arquivo:
+                    anexo.duplicata_de = original.caminho
+                    self.materializador.registrar_duplicado(anexo.tamanho)
+                return anexo
+            destino_arquivo = os.path.join(self._pasta_anexos_local, nome_arquivo)
+            # Nomes diferentes podem levar ao mesmo arquivo: copiado uma vez só
+            if destino_arquivo not in self._destinos and not os.path.exists(destino_arquivo):
+                self.materializador.agendar(caminho_arquivo, destino_arquivo)
+            self._destinos.add(destino_arquivo)
+            anexo.url = f"anexos_conversa/{nome_arquivo}"
+            if self.gerador_miniaturas is not None and anexo.tipo == "imagem":
+                anexo.miniatura = self.gerador_miniaturas.agendar(caminho_arquivo)
+        else:
+            anexo.url = nome_arquivo
+        return anexo
+
+    def _hash(self, caminho_arquivo):
+        digest = self.hashes.get(caminho_arquivo)
+        if digest is None:
+            digest = self.hashes[caminho_arquivo] = hash_conteudo_anexo(caminho_arquivo, self.pasta_midias)
+        return digest
+
+    def _conteudo_identico(self, anexo):
+        """
+        Anexo já copiado com o mesmo conteúdo de 'anexo', ou None; neste caso
+        'anexo' passa a ser o original do seu conteúdo.
+        """
+        if anexo.tamanho is None:
+            return None
+        chave = anexo.tamanho
+        if isinstance(self.pasta_midias, MidiasZip):
+            chave = (chave, self.pasta_midias.membros[anexo.caminho].CRC)
+        grupo = self._por_tamanho.setdefault(chave, [])
+        try:
+            for original in grupo:
+                if original.caminho == anexo.caminho or self._hash(original.caminho) == self._hash(anexo.caminho):
+                    return original
+        except ERROS_LEITURA_ANEXO:
+            return None
+        grupo.append(anexo)
+        return None
+
+    def html(self, nome):
+        """HTML do anexo (com o aviso de ambiguidade, se houver), montado uma vez por nome"""
+        anexo = self.resolver(nome)
+        if anexo.html is None:
+            anexo.html = (gerar_html_anexo(anexo, self.usar_servidor, self.carregamento_lento)
+                          + gerar_aviso_ambiguo(anexo))
+        return anexo.html
+
+    def gravar_csv(self, arquivo_saida):
+        """Grava a tabela em CSV, uma linha por nome de anexo"""
+        with open(arquivo_saida, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Anexo', 'Situacao', 'Caminho', 'Tamanho', 'Tipo', 'Ocorrencias', 'Candidatos',
+                             'Mesmo conteudo que'])
+            for anexo in self.anexos.values():
+                candidatos = "; ".join(anexo.candidatos[1]) if anexo.candidatos else ""
+                writer.writerow([anexo.nome, anexo.status, anexo.caminho or "",
+                                 anexo.tamanho if anexo.tamanho is not None else "", anexo.tipo,
+                                 anexo.ocorrencias, candidatos, anexo.duplicata_de or ""])
+
+# Cria o <iframe> de cada PDF (modo servidor, carregamento lento) quando o
+# espaço reservado é clicado ou chega perto da área visível da página
+SCRIPT_CARREGAMENTO_LENTO = '''
+        <script>
+            function carregarPdf(reservado) {
+                if (!reservado.isConnected) return;
+                var iframe = document.createElement('iframe');
+                iframe.src = reservado.dataset.src;
+                iframe.width = '100%';
+                iframe.height = '400px';
+                iframe.style.cssText = 'margin-top:8px;border:none;border-radius:4px;';
+                reservado.replaceWith(iframe);
+            }
+            if ('IntersectionObserver' in window) {
+                var observadorPdf = new IntersectionObserver(function (entradas) {
+                    entradas.forEach(function (entrada) {
+                        if (entrada.isIntersecting) {
+                            observadorPdf.unobserve(entrada.target);
+                            carregarPdf(entrada.target);
+                        }
+                    });
+                }, {rootMargin: '200px 0px'});
+                document.querySelectorAll('.pdf-lento').forEach(function (reservado) {
+                    observadorPdf.observe(reservado);
+                });
+            }
+        </script>'''
+
+def gerar_html_anexo(anexo, usar_servidor=False, carregamento_lento=True):
+    """
+    Gera HTML especÃ­fico para cada tipo de anexo (um AnexoResolvido).
+
+    Com 'carregamento_lento', o navegador só busca cada mídia quando ela é
+    necessária: imagens com loading="lazy", áudio e vídeo com preload="none"
+    e, no modo servidor, o PDF só ganha o <iframe> quando é clicado ou
+    aparece na tela (veja SCRIPT_CARREGAMENTO_LENTO).
+    """
+    if not anexo.caminho:
+        return f'<span style="color:red;font-size:90%;background:#ffe6e6;padding:2px 6px;border-radius:3px;">Arquivo "{anexo.nome}" nÃ£o encontrado</span>'
+    
+    nome_arquivo = anexo.nome_arquivo
+    extensao = anexo.extensao
+    caminho_url = anexo.url
+    
+    if anexo.tipo == "imagem":
+        # Com miniatura, ela é exibida e o clique abre o original; se a
+        # miniatura não carregar, o próprio original é exibido no lugar
+        src, original, abrir, alternativa = caminho_url, "", "this.src", ""
+        if anexo.miniatura:
+            src, original, abrir = anexo.miniatura, f' data-original="{caminho_url}"', "this.dataset.original"
+            alternativa = "if (!this.dataset.falhou) { this.dataset.falhou = 1; this.src = this.dataset.original; return; } "
+        if carregamento_lento:
+            original += ' loading="lazy" decoding="async"'
+        return f'''
+        <div style="margin:8px 0;">
+            <strong>ðŸ–¼ï¸ {nome_arquivo}</strong><br>
+            <img src="{src}"{original} alt="{nome_arquivo}" 
+                 style="max-width:400px;max-height:300px;border-radius:8px;margin:5px 0;border:1px solid #ddd;cursor:pointer;"
+                 onclick="window.open({abrir}, '_blank')" onerror="{alternativa}this.style.display='none'; this.nextElementSibling.style.display='block';">
+            <div style="display:none;padding:20px;background:#f0f0f0;text-align:center;border-radius:8px;">
+                <p>Erro ao carregar imagem</p>
+                <a href="{caminho_url}" target="_blank" style="color:#1976d2;">Clique para abrir</a>
+            </div>
+        </div>'''
+    
+    elif anexo.tipo == "pdf":
+        if usar_servidor:
+            visualizacao = f'<iframe src="{caminho_url}" width="100%" height="400px" style="margin-top:8px;border:none;border-radius:4px;"></iframe>'
+            if carregamento_lento:
+                # Espaço reservado do mesmo tamanho; o <iframe> é criado pelo script da página
+                visualizacao = (f'<div class="pdf-lento" data-src="{caminho_url}" onclick="carregarPdf(this)" '
+                                f'style="height:400px;margin-top:8px;border-radius:4px;background:#f0f0f0;display:flex;'
+                                f'align-items:center;justify-content:center;color:#666;cursor:pointer;">'
+                                f'Clique para visualizar o PDF</div>')
+            return f'''
+            <div style="border:1px solid #ccc;padding:12px;margin:8px 0;border-radius:8px;background:#f9f9f9;max-width:500px;">
+                <strong>ðŸ"„ {nome_arquivo}</strong><br>
+                {visualizacao}
+                <br><a href="{caminho_url}" target="_blank" 
+                       style="display:inline-block;padding:8px 16px;background:#dc3545;color:white;text-decoration:none;border-radius:4px;font-weight:bold;margin-top:8px;">
+                       ðŸ"„ ABRIR PDF EM NOVA ABA</a>
+            </div>'''
+        else:
+            return f'''
+            <div style="border:1px solid #ccc;padding:12px;margin:8px 0;border-radius:8px;background:#f9f9f9;max-width:500px;">
+                <strong>ðŸ"„ {nome_arquivo}</strong><br>
+                <div style="text-align:center;padding:20px;background:#f0f0f0;margin:8px 0;border-radius:4px;">
+                    <p style="margin:0 0 10px 0;">ðŸ"„ Documento PDF</p>
+                    <p style="font-size:12px;color:#666;margin:0 0 15px 0;">Arquivo copiado para a pasta local</p>
+                    <a href="{caminho_url}" target="_blank" download="{nome_arquivo}"
+                       style="display:inline-block;padding:10px 20px;background:#dc3545;color:white;text-decoration:none;border-radius:6px;font-weight:bold;">
+                       ðŸ"„ BAIXAR PDF</a>
+                </div>
+            </div>'''
+    
+    elif anexo.tipo == "video":
+        pre_carregamento = ' preload="none"' if carregamento_lento else ''
+        return f'''
+        <div style="margin:8px 0;">
+            <strong>ðŸŽ¬ {nome_arquivo}</strong><br>
+            <video controls{pre_carregamento} style="max-width:400px;border-radius:8px;margin:5px 0;">
+                <source src="{caminho_url}" type="video/{extensao}">
+                Seu navegador nÃ£o suporta reproduÃ§Ã£o de vÃ­deo.
+                <p><a href="{caminho_url}" target="_blank" download="{nome_arquivo}">Clique para baixar o vÃ­deo</a></p>
+            </video>
+        </div>'''
+    
+    elif anexo.tipo == "audio":
+        pre_carregamento = ' preload="none"' if carregamento_lento else ''
+        return f'''
+        <div style="margin:8px 0;padding:8px;background:#f0f8ff;border-radius:8px;max-width:350px;">
+            <strong>ðŸŽµ {nome_arquivo}</strong><br>
+            <audio controls{pre_carregamento} style="width:100%;margin-top:5px;">
+                <source src="{caminho_url}" type="audio/{extensao}">
+                Seu navegador nÃ£o suporta reproduÃ§Ã£o de Ã¡udio.
+                <p><a href="{caminho_url}" target="_blank" download="{nome_arquivo}">Clique para baixar o Ã¡udio</a></p>
+            </audio>
+        </div>'''
+    
+    else:
+        return f'''
+        <div style="border:1px solid #e0e0e0;padding:10px;margin:5px 0;border-radius:4px;background:#f8f9fa;display:inline-block;">
+            <strong>ðŸ"Ž {nome_arquivo}</strong><br>
+            <a href="{caminho_url}" target="_blank" download="{nome_arquivo}"
+               style="display:inline-block;margin-top:5px;padding:6px 12px;background:#007bff;color:white;text-decoration:none;border-radius:3px;">
+               ðŸ'¾ BAIXAR ARQUIVO</a>
+        </div>'''
+
+# Datas já decodificadas, por ordem da data: 'DD/MM/AAAA' -> ('AAAA-MM-DD',
+# segundos até 00:00 do dia) ou None quando a data é inválida. Milhares de
+# mensagens compartilham o mesmo dia.
+_cache_datas = {"DMA": {}, "MDA": {}, "AMD": {}}
+_ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+
+REGEX_SEPARADOR_DATA = re.compile(r'[./-]')
+
+def decodificar_timestamp(data_str, hora_str, ordem_data="DMA"):
+    """
+    Converte 'DD/MM/AAAA' e 'HH:MM:SS' (ou 'HH:MM') em (timestamp_iso, epoch).
+    'ordem_data' ("DMA", "MDA" ou "AMD") indica a ordem dos campos da data,
+    que podem ser separados por '/', '.' ou '-'; anos com 2 dígitos são
+    deste século. A hora pode vir no relógio de 12 horas ('9:41 PM').
+    O epoch é o número de segundos desde 1970-01-01 00:00 do horário de
+    parede da exportação, que não informa fuso. Para datas ou horas
+    inválidas, retorna o texto original e epoch None.
+    """
+    pm = None
+    if not hora_str[-1].isdigit():
+        # Relógio de 12 horas: '9:41 PM', '9:41:05 p. m.'
+        texto_hora = hora_str
+        hora_str = hora_str.rstrip('AaPpMm. ')
+        pm = texto_hora[len(hora_str):].lstrip()[:1] in ('P', 'p')
+    if hora_str.count(':') == 1:
+        hora_str += ":00"
+    if pm is None:
+        texto_hora = hora_str
+
+    cache = _cache_datas[ordem_data]
+    try:
+        dia = cache[data_str]
+    except KeyError:
+        try:
+            if ordem_data == "DMA":
+                d, m, a = REGEX_SEPARADOR_DATA.split(data_str)
+            elif ordem_data == "MDA":
+                m, d, a = REGEX_SEPARADOR_DATA.split(data_str)
+            else:
+                a, m, d = REGEX_SEPARADOR_DATA.split(data_str)
+            data = date(int(a) + (2000 if len(a) == 2 else 0), int(m), int(d))
+            dia = (data.isoformat(), (data.toordinal() - _ORDINAL_EPOCH) * 86400)
+        except ValueError:
+            dia = None
+        cache[data_str] = dia
+
+    if dia is not None:
+        h, m, s = hora_str.split(':')
+        h, m, s = int(h), int(m), int(s)
+        if pm is not None:
+            # 12 AM é meia-noite e 12 PM, meio-dia; horas fora de 1-12 são inválidas
+            h = h % 12 + (12 if pm else 0) if 1 <= h <= 12 else 24
+        if h < 24 and m < 60 and s < 60:
+            return f"{dia[0]} {h:02d}:{m:02d}:{s:02d}", dia[1] + h * 3600 + m * 60 + s
+
+    return f"{data_str} {texto_hora}", None
+
+# Datas já formatadas a partir do número de dias desde 1970-01-01
+_cache_dias = {}
+
+def formatar_epoch(epoch):
+    """Converte um epoch de decodificar_timestamp de volta em 'AAAA-MM-DD HH:MM:SS'"""
+    dia, segundos = divmod(epoch, 86400)
+    data_iso = _cache_dias.get(dia)
+    if data_iso is None:
+        data_iso = _cache_dias[dia] = date.fromordinal(dia + _ORDINAL_EPOCH).isoformat()
+    h, resto = divmod(segundos, 3600)
+    m, s = divmod(resto, 60)
+    return f"{data_iso} {h:02d}:{m:02d}:{s:02d}"
+
+class Mensagem:
+    """
+    Uma mensagem da conversa. Usa __slots__ para ocupar uma fração da memória
+    de um dicionário: o nome do usuário é internado (uma cópia por
+    participante), o horário fica como epoch inteiro e os anexos em uma tupla.
+    """
+    __slots__ = ("user", "texto", "epoch", "timestamp_original", "anexos", "tipo", "linha")
+
+    def __init__(self, user, texto, timestamp, epoch, anexos=(), tipo="mensagem", linha=0):
+        self.user = sys.intern(user)
+        self.texto = texto
+        self.epoch = epoch
+        # O texto do horário só é guardado quando não pôde ser decodificado
+        self.timestamp_original = None if epoch is not None else timestamp
+        self.anexos = anexos
+        self.tipo = tipo
+        self.linha = linha
+
+    @property
+    def timestamp(self):
+        """Horário no formato 'AAAA-MM-DD HH:MM:SS' (ou o texto original, se inválido)"""
+        if self.epoch is None:
+            return self.timestamp_original
+        return formatar_epoch(self.epoch)
+
+    @property
+    def info_extra(self):
+        """Anexos separados por vírgula, como na coluna Anexos do CSV"""
+        return ", ".join(self.anexos)
+
+    def como_tupla(self):
+        """Campos em uma tupla simples, para serialização rápida (JSON no cache)"""
+        return (self.user, self.texto, self.epoch, self.timestamp_original, self.anexos, self.tipo, self.linha)
+
+    @classmethod
+    def de_tupla(cls, campos):
+        """Reconstrói a mensagem a partir de como_tupla()"""
+        user, texto, epoch, timestamp_original, anexos, tipo, linha = campos
+        return cls(user, texto, timestamp_original, epoch, tuple(anexos), tipo, linha)
+
+    def __repr__(self):
+        return f"Mensagem(linha={self.linha}, user={self.user!r}, timestamp={self.timestamp!r}, tipo={self.tipo!r})"
+
+# Extensões reconhecidas como anexo quando aparecem no texto da mensagem
+EXTENSOES_ANEXO = ('pdf', 'jpg', 'jpeg', 'png', 'mp4', 'mp3', 'doc', 'docx', 'xls', 'xlsx', 'wav', 'ogg', 'm4a',
+                   'avi', 'mov', 'mkv', 'webm', 'gif', 'bmp', 'aac', 'ppt', 'pptx', 'opus')
+
+def compilar_regex_anexos(extensoes):
+    """
+    Monta os padrões de anexo em uma única expressão, na ordem de prioridade:
+      <anexado: arquivo>
+      nome com espaços.ext •      (só testado quando há o marcador •)
+      nome.ext
+    Retorna (regex completa, regex sem o padrão do marcador •).
+    """
+    # Extensões mais longas primeiro, para 'docx' não virar 'doc'
+    ext = '|'.join(sorted((re.escape(e.lower().lstrip('.')) for e in extensoes), key=len, reverse=True))
+    anexado = r'<anexado:\s*([^>]+)>'
+    com_marcador = r'([^\sâ€Ž/\\]+(?:\s+[^\sâ€Ž/\\]*)*\.(?:' + ext + r'))\b\s*â€¢'
+    simples = r'([^â€Ž\s/\\]+\.(?:' + ext + r'))\b(?!\s*â€¢)'
+    return (re.compile('|'.join((anexado, com_marcador, simples)), re.IGNORECASE),
+            re.compile('|'.join((anexado, simples)), re.IGNORECASE))
+
+REGEX_ANEXOS, REGEX_ANEXOS_SEM_MARCADOR = compilar_regex_anexos(EXTENSOES_ANEXO)
+
+def configurar_extensoes_anexo(extensoes):
+    """Troca a lista de extensões reconhecidas como anexo"""
+    global EXTENSOES_ANEXO, REGEX_ANEXOS, REGEX_ANEXOS_SEM_MARCADOR
+    EXTENSOES_ANEXO = tuple(extensoes)
+    REGEX_ANEXOS, REGEX_ANEXOS_SEM_MARCADOR = compilar_regex_anexos(EXTENSOES_ANEXO)
+
+def processar_anexos(texto):
+    """
+    Processa diferentes tipos de anexos e referências de mídia. Retorna os
+    nomes na ordem em que aparecem no texto, sem repetições.
+    """
+    # Todo anexo tem um '.' antes da extensão ou vem em <anexado: ...>
+    if '.' not in texto and '<' not in texto:
+        return []
+
+    # O padrão com o marcador • é caro; só é usado quando o marcador existe
+    regex = REGEX_ANEXOS if 'â€¢' in texto else REGEX_ANEXOS_SEM_MARCADOR
+
+    anexos_limpos = {}
+    for match in regex.finditer(texto):
+        # Só um dos grupos participa de cada ocorrência
+        anexo = match.group(match.lastindex)
+        anexo_limpo = limpar_nome_arquivo(anexo.strip())
+        if anexo_limpo:
+            anexos_limpos[anexo_limpo] = None
+    
+    return list(anexos_limpos)
+
+# Quantidade de bytes do início do arquivo usada para detectar a codificação
+TAMANHO_AMOSTRA_ENCODING = 64 * 1024
+
+# Marcas de ordem de bytes (UTF-32 antes de UTF-16, que é prefixo dela)
+BOMS_ENCODING = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+def detectar_encoding(amostra):
+    """
+    Detecta a codificação a partir dos primeiros bytes do arquivo:
+    BOM, se houver; senão UTF-8 se a amostra for UTF-8 válido; senão
+    cp1252 (exportações do Windows) ou, em último caso, latin1.
+    """
+    for bom, encoding in BOMS_ENCODING:
+        if amostra.startswith(bom):
+            return encoding
+
+    try:
+        # Decodificador incremental: a amostra pode terminar no meio de um caractere
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        amostra.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def e_arquivo_zip(caminho):
+    """Verifica se o caminho é uma exportação compactada (.zip)"""
+    return caminho.lower().endswith('.zip') and zipfile.is_zipfile(caminho)
+
+def localizar_chat_zip(zf):
+    """Nome do membro com o texto da conversa: '_chat.txt' ou o primeiro .txt"""
+    nomes = sorted(info.filename for info in zf.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.txt'))
+    for nome in nomes:
+        if os.path.basename(nome) == '_chat.txt':
+            return nome
+    return nomes[0] if nomes else None
+
+@contextlib.contextmanager
+def abrir_exportacao(arquivo_txt):
+    """
+    Abre o texto da conversa em modo binário. Em uma exportação .zip, o
+    membro da conversa é descompactado à medida que é lido, sem ir ao disco.
+    """
+    if not e_arquivo_zip(arquivo_txt):
+        with open(arquivo_txt, 'rb') as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(arquivo_txt) as zf:
+        membro = localizar_chat_zip(zf)
+        if membro is None:
+            raise ValueError(f"Nenhum arquivo .txt de conversa em {arquivo_txt}")
+        with zf.open(membro) as f:
+            yield f
+
+def detectar_encoding_arquivo(arquivo_txt):
+    """Lê apenas a amostra inicial do arquivo e detecta sua codificação"""
+    with abrir_exportacao(arquivo_txt) as f:
+        return detectar_encoding(f.read(TAMANHO_AMOSTRA_ENCODING))
+
+def e_encoding_multibyte(encoding):
+    """UTF-16/32 não podem ser lidas nem divididas por bytes '\\n'"""
+    return codecs.lookup(encoding).name.startswith(('utf-16', 'utf-32'))
+
+def decodificar_linha(linha_bytes, encoding):
+    """Decodifica uma linha; se falhar na codificação detectada, usa latin1"""
+    try:
+        return linha_bytes.decode(encoding)
+    except UnicodeDecodeError:
+        return linha_bytes.decode('latin1')
+
+def ler_linhas(arquivo_txt, encoding=None, inicio=0, fim=None):
+    """
+    Lê o arquivo linha a linha, sem carregar o conteúdo inteiro na memória.
+    Sem 'encoding', a codificação é detectada pela amostra inicial. Linhas
+    que não puderem ser decodificadas com ela são lidas como latin1.
+
+    'inicio' e 'fim' limitam a leitura a um trecho em bytes do arquivo;
+    'inicio' deve estar no começo de uma linha. Uma exportação .zip é
+    sempre lida por inteiro, em sequência.
+    """
+    if not encoding:
+        encoding = detectar_encoding_arquivo(arquivo_txt)
+
+    if e_arquivo_zip(arquivo_txt):
+        with abrir_exportacao(arquivo_txt) as f:
+            if e_encoding_multibyte(encoding):
+                yield from io.TextIOWrapper(f, encoding=encoding, errors='replace')
+            else:
+                for linha_bytes in f:
+                    yield decodificar_linha(linha_bytes, encoding)
+        return
+
+    if e_encoding_multibyte(encoding):
+        with open(arquivo_txt, encoding=encoding, errors='replace') as f:
+            yield from f
+        return
+
+    with open(arquivo_txt, 'rb') as f:
+        if inicio:
+            f.seek(inicio)
+        posicao = inicio
+        for linha_bytes in f:
+            if fim is not None and posicao >= fim:
+                break
+            posicao += len(linha_bytes)
+            yield decodificar_linha(linha_bytes, encoding)
+
+# Tamanho mínimo de cada trecho no modo com vários processos
+TAMANHO_MINIMO_BLOCO = 4 * 1024 * 1024
+
+def proximo_cabecalho(f, posicao, encoding, exportacao=None):
+    """
+    Avança a partir de 'posicao' até o início da próxima linha que seja
+    cabeçalho de mensagem e retorna essa posição (ou o fim do arquivo).
+    """
+    reconhecer = exportacao.reconhecer if exportacao else reconhecer_cabecalho
+    if posicao > 0:
+        f.seek(posicao - 1)
+        if f.read(1) != b'\n':
+            # Descarta o restante da linha que foi cortada ao meio
+            f.readline()
+    else:
+        f.seek(0)
+
+    while True:
+        posicao = f.tell()
+        linha_bytes = f.readline()
+        if not linha_bytes:
+            return posicao
+        linha_limpa = limpar_linha(decodificar_linha(linha_bytes, encoding).strip())
+        if reconhecer(linha_limpa):
+            return posicao
+
+def dividir_em_blocos(arquivo_txt, quantidade, encoding, exportacao=None):
+    """
+    Divide o arquivo em até 'quantidade' trechos (inicio, fim) em bytes,
+    cada um começando no cabeçalho de uma mensagem.
+    """
+    tamanho = os.path.getsize(arquivo_txt)
+    quantidade = max(1, min(quantidade, tamanho // TAMANHO_MINIMO_BLOCO))
+    if quantidade == 1:
+        return [(0, tamanho)]
+
+    limites = [0]
+    with open(arquivo_txt, 'rb') as f:
+        for i in range(1, quantidade):
+            limite = proximo_cabecalho(f, tamanho * i // quantidade, encoding, exportacao)
+            if limite > limites[-1]:
+                limites.append(limite)
+    limites.append(tamanho)
+
+    return [(inicio, fim) for inicio, fim in zip(limites, limites[1:]) if fim > inicio]
+
+def parse_bloco(arquivo_txt, inicio, fim, encoding, extensoes=EXTENSOES_ANEXO, exportacao=None,
+                regras=None):
+    """
+    Processa um trecho do arquivo em um processo separado. Retorna
+    (mensagens, linhas lidas, formato); os números de linha são relativos
+    ao início do trecho. 'exportacao' traz os parâmetros do formato
+    detectado no início do arquivo (FormatoExportacao.parametros()), ou None
+    se nenhum foi detectado: nesse caso o trecho usa reconhecer_cabecalho,
+    como a leitura sequencial, sem tentar detectar o formato nas suas
+    próprias primeiras linhas.
+    """
+    # O processo pode ter sido criado sem a configuração do processo principal
+    if tuple(extensoes) != EXTENSOES_ANEXO:
+        configurar_extensoes_anexo(extensoes)
+    if regras is not None and regras != REGRAS_TIPO:
+        configurar_regras_tipo(regras)
+    estado = {}
+    exportacao = FormatoExportacao(*exportacao) if exportacao else False
+    mensagens = list(parse_linhas(ler_linhas(arquivo_txt, encoding, inicio, fim), estado,
+                                  verboso=False, exportacao=exportacao))
+    return mensagens, estado["linhas"], estado["formato"]
+
+def iter_mensagens_paralelo(arquivo_txt, estado, encoding, jobs):
+    """
+    Processa o arquivo em trechos distribuídos entre 'jobs' processos e
+    devolve as mensagens na ordem original, com os números de linha corrigidos.
+    """
+    # O formato é detectado uma vez, no início do arquivo, e vale para todos os trechos
+    exportacao = detectar_formato_arquivo(arquivo_txt, encoding)
+    blocos = dividir_em_blocos(arquivo_txt, jobs * 4, encoding, exportacao)
+    # Sem formato detectado, False faz parse_linhas usar reconhecer_cabecalho sem detectar de novo
+    exportacao = exportacao or False
+    if len(blocos) == 1:
+        yield from parse_linhas(ler_linhas(arquivo_txt, encoding), estado, exportacao=exportacao)
+        return
+
+    print(f"Processando {len(blocos)} trechos em {jobs} processos...")
+    if exportacao:
+        print(f"Formato detectado: {exportacao.descricao}")
+    parametros = exportacao.parametros() if exportacao else None
+    estado["exportacao"] = parametros
+    linhas_anteriores = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Mantém poucos trechos em andamento para não acumular resultados na memória
+        pendentes = collections.deque()
+        blocos = iter(blocos)
+        for inicio, fim in itertools.islice(blocos, jobs * 2):
+            pendentes.append(executor.submit(parse_bloco, arquivo_txt, inicio, fim, encoding, EXTENSOES_ANEXO, parametros,
+                                            REGRAS_TIPO))
+
+        while pendentes:
+            mensagens, linhas, formato = pendentes.popleft().result()
+            for inicio, fim in itertools.islice(blocos, 1):
+                pendentes.append(executor.submit(parse_bloco, arquivo_txt, inicio, fim, encoding, EXTENSOES_ANEXO, parametros,
+                                            REGRAS_TIPO))
+
+            if formato and not estado["formato"]:
+                estado["formato"] = formato
+            for msg in mensagens:
+                msg.linha += linhas_anteriores
+                estado["mensagens"] += 1
+                yield msg
+            linhas_anteriores += linhas
+            estado["linhas"] = linhas_anteriores
+
+def iter_mensagens(arquivo_txt, estado=None, encoding=None, jobs=1):
+    """
+    Lê o arquivo .txt exportado do WhatsApp e devolve as mensagens uma a uma.
+    Cada mensagem é entregue assim que o cabeçalho da próxima é encontrado,
+    de modo que o uso de memória não cresce com o tamanho do arquivo.
+
+    Se 'estado' for um dicionário, ele é preenchido com 'encoding', 'formato',
+    'linhas' e 'mensagens' à medida que o arquivo é processado. Sem
+    'encoding', a codificação é detectada pelos primeiros bytes do arquivo.
+    Com 'jobs' maior que 1, o arquivo é dividido entre vários processos, o
+    que não se aplica a uma exportação .zip, lida em sequência direto do arquivo.
+    """
+    if estado is None:
+        estado = {}
+    if not encoding:
+        encoding = detectar_encoding_arquivo(arquivo_txt)
+    estado["encoding"] = encoding
+    estado.setdefault("formato", None)
+    estado["linhas"] = 0
+    estado["mensagens"] = 0
+
+    if jobs > 1 and not e_encoding_multibyte(encoding) and not e_arquivo_zip(arquivo_txt):
+        return iter_mensagens_paralelo(arquivo_txt, estado, encoding, jobs)
+    return parse_linhas(ler_linhas(arquivo_txt, encoding), estado)
+
+# Incrementar sempre que o resultado do parser mudar, para invalidar os caches gravados
+VERSAO_PARSER = 4
+
+# Mensagens gravadas por bloco (uma linha JSON) no arquivo de cache
+MENSAGENS_POR_BLOCO_CACHE = 10000
+
+# Rodapé do cache: posição do resumo, em 20 dígitos e quebra de linha
+TAMANHO_RODAPE_CACHE = 21
+
+def caminho_cache(arquivo_txt):
+    """Arquivo de cache gravado ao lado da exportação"""
+    return os.path.splitext(arquivo_txt)[0] + "_conversa.cache"
+
+def calcular_hash_arquivo(caminho, algoritmo='sha256', tamanho_bloco=1024 * 1024):
+    """Hash do conteúdo do arquivo, lido em blocos"""
+    h = hashlib.new(algoritmo)
+    with open(caminho, 'rb') as f:
+        while True:
+            bloco = f.read(tamanho_bloco)
+            if not bloco:
+                break
+            h.update(bloco)
+    return h.hexdigest()
+
+def chave_cache(arquivo_txt, encoding):
+    """
+    Chave do cache, sem ler o conteúdo do arquivo: versão do parser, tamanho
+    e data de modificação (os.stat), codificação e as opções que afetam o
+    resultado (extensões de anexo e regras de tipo). O SHA-256 do conteúdo
+    não faz parte dela; iter_mensagens_cache o acrescenta depois, calculado
+    só quando tamanho e data não bastam para decidir sobre o cache.
+    """
+    info = os.stat(arquivo_txt)
+    return {
+        "versao": VERSAO_PARSER,
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "encoding": encoding,
+        "extensoes": valor_json(EXTENSOES_ANEXO),
+        "regras": valor_json(REGRAS_TIPO),
+    }
+
+def valor_json(valor):
+    """Valor como ele volta depois de gravado em JSON (tuplas viram listas)"""
+    return json.loads(json.dumps(valor))
+
+def linha_json(valor):
+    """Valor serializado em uma linha JSON, em bytes"""
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+def opcoes_compativeis(cabecalho, chave):
+    """Confere se o cache foi gravado pela mesma versão e com as mesmas opções"""
+    return all(cabecalho.get(campo) == chave[campo] for campo in ("versao", "encoding", "extensoes", "regras"))
+
+def ler_cabecalho_cache(arquivo_cache):
+    """
+    Retorna (cabeçalho, resumo) do cache, ou (None, None) se ele não existir
+    ou estiver incompleto. O cache é texto JSON, uma linha por registro
+    (cabeçalho, blocos de mensagens e resumo); o resumo fica no fim do
+    arquivo, e o rodapé guarda a posição em que ele começa.
+    """
+    try:
+        with open(arquivo_cache, 'rb') as f:
+            cabecalho = json.loads(f.readline())
+            f.seek(-TAMANHO_RODAPE_CACHE, os.SEEK_END)
+            f.seek(int(f.read(TAMANHO_RODAPE_CACHE)))
+            resumo = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None, None
+    if not isinstance(cabecalho, dict) or not isinstance(resumo, dict):
+        return None, None
+    return cabecalho, resumo
+
+def ler_cache(arquivo_cache, estado=None):
+    """Devolve as mensagens gravadas no cache e, ao final, restaura 'estado'"""
+    with open(arquivo_cache, 'rb') as f:
+        f.readline()  # cabeçalho, já conferido
+        for linha in f:
+            bloco = json.loads(linha)
+            if isinstance(bloco, dict):
+                if estado is not None:
+                    estado.update((campo, bloco[campo]) for campo in ("encoding", "formato", "linhas", "mensagens"))
+                return
+            for campos in bloco:
+                yield Mensagem.de_tupla(campos)
+
+def localizar_ultimo_cabecalho(arquivo_txt, encoding, exportacao, tamanho_bloco=64 * 1024):
+    """
+    Posição em bytes do início da última linha de cabeçalho do arquivo,
+    lendo de trás para frente (None se não houver nenhum cabeçalho).
+    """
+    with open(arquivo_txt, 'rb') as f:
+        fim = f.seek(0, os.SEEK_END)
+        resto = b''
+        while fim > 0:
+            inicio = max(0, fim - tamanho_bloco)
+            f.seek(inicio)
+            dados = f.read(fim - inicio) + resto
+            linhas = dados.split(b'\n')
+            # Se o bloco não começa no início do arquivo, a primeira linha está
+            # incompleta e é completada na próxima leitura
+            resto = linhas.pop(0) if inicio > 0 else b''
+            posicao = len(dados)
+            for linha_bytes in reversed(linhas):
+                posicao -= len(linha_bytes)
+                if exportacao.reconhecer(limpar_linha(decodificar_linha(linha_bytes, encoding).strip())):
+                    return inicio + posicao
+                posicao -= 1
+            fim = inicio
+    return None
+
+def gravar_cache(mensagens, arquivo_txt, arquivo_cache, cabecalho, estado, com_csv=False):
+    """
+    Repassa as mensagens adiante enquanto as grava no cache. O arquivo só
+    substitui o cache anterior quando todas as mensagens foram gravadas.
+    Além do resumo do processamento, guarda a posição e a cópia da última
+    mensagem, usadas na leitura incremental da próxima exportação.
+    """
+    temporario = arquivo_cache + ".tmp"
+    try:
+        f = open(temporario, 'wb')
+    except OSError as e:
+        print(f"Não foi possível gravar o cache ({e}); continuando sem cache")
+        yield from mensagens
+        return
+
+    try:
+        with f:
+            f.write(linha_json(cabecalho))
+            bloco = []
+            ultima = None
+            for msg in mensagens:
+                bloco.append(msg.como_tupla())
+                if len(bloco) >= MENSAGENS_POR_BLOCO_CACHE:
+                    f.write(linha_json(bloco))
+                    bloco = []
+                ultima = msg
+                yield msg
+            if bloco:
+                f.write(linha_json(bloco))
+
+            resumo = {campo: estado[campo] for campo in ("encoding", "formato", "linhas", "mensagens")}
+            resumo["csv"] = com_csv
+            resumo["ultima"] = ultima.como_tupla() if ultima else None
+            resumo["exportacao"] = estado.get("exportacao")
+            resumo["posicao_ultima"] = None
+            # A releitura do final exige o formato detectado e posições em bytes no texto
+            if ultima and resumo["exportacao"] and not e_encoding_multibyte(estado["encoding"]) \
+                    and not e_arquivo_zip(arquivo_txt):
+                resumo["posicao_ultima"] = localizar_ultimo_cabecalho(
+                    arquivo_txt, estado["encoding"], FormatoExportacao(*resumo["exportacao"]))
+            posicao_resumo = f.tell()
+            f.write(linha_json(resumo))
+            f.write(f"{posicao_resumo:0{TAMANHO_RODAPE_CACHE - 1}d}\n".encode('ascii'))
+        os.replace(temporario, arquivo_cache)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def hash_prefixo(arquivo_txt, tamanho_prefixo, tamanho_bloco=1024 * 1024):
+    """
+    Calcula, em uma só leitura, o SHA-256 dos primeiros 'tamanho_prefixo'
+    bytes e o do arquivo inteiro. Retorna (hash do prefixo, hash completo).
+    """
+    h = hashlib.sha256()
+    hash_inicio = None
+    lidos = 0
+    with open(arquivo_txt, 'rb') as f:
+        while True:
+            bloco = f.read(min(tamanho_bloco, tamanho_prefixo - lidos) if lidos < tamanho_prefixo else tamanho_bloco)
+            if not bloco:
+                break
+            h.update(bloco)
+            lidos += len(bloco)
+            if lidos == tamanho_prefixo:
+                hash_inicio = h.hexdigest()
+    return hash_inicio, h.hexdigest()
+
+def iter_mensagens_incremental(arquivo_txt, arquivo_cache, resumo, estado):
+    """
+    Processa só o final de uma exportação que cresceu desde o último cache.
+    A última mensagem do cache é relida (ela pode ter ganho linhas de
+    continuação) e precisa coincidir com a gravada; caso contrário retorna
+    None e o arquivo deve ser processado por inteiro.
+    """
+    encoding = resumo["encoding"]
+    ultima = Mensagem.de_tupla(resumo["ultima"])
+    deslocamento_linhas = ultima.linha - 1
+
+    estado_final = {}
+    novas = parse_linhas(ler_linhas(arquivo_txt, encoding, resumo["posicao_ultima"]),
+                         estado_final, verboso=False, exportacao=FormatoExportacao(*resumo["exportacao"]))
+    primeira = next(novas, None)
+    if primeira is None:
+        return None
+    primeira.linha += deslocamento_linhas
+    if (primeira.user, primeira.epoch, primeira.timestamp_original) != \
+            (ultima.user, ultima.epoch, ultima.timestamp_original) or \
+            not primeira.texto.startswith(ultima.texto):
+        return None
+
+    # A última mensagem não mudou: as anteriores podem ser mantidas no CSV
+    estado["ultima_inalterada"] = primeira.como_tupla() == ultima.como_tupla()
+
+    def gerar():
+        with contextlib.closing(ler_cache(arquivo_cache)) as anteriores:
+            for msg in itertools.islice(anteriores, resumo["mensagens"] - 1):
+                estado["mensagens"] += 1
+                yield msg
+        estado["mensagens"] += 1
+        yield primeira
+        for msg in novas:
+            msg.linha += deslocamento_linhas
+            estado["mensagens"] += 1
+            yield msg
+        estado["linhas"] = deslocamento_linhas + estado_final["linhas"]
+
+    estado.update(encoding=encoding, formato=resumo["formato"], exportacao=resumo["exportacao"],
+                  linhas=resumo["linhas"], mensagens=0, mensagens_anteriores=resumo["mensagens"])
+    return gerar()
+
+def iter_mensagens_cache(arquivo_txt, estado, encoding=None, jobs=1, com_csv=False):
+    """
+    Usa o cache gravado ao lado da exportação quando ele corresponde ao
+    arquivo atual. Com o mesmo tamanho e a mesma data de modificação o
+    cache é usado sem ler a exportação; se só a data mudou, o SHA-256 do
+    arquivo decide. Se a exportação apenas cresceu (mensagens novas no fim),
+    o hash dos bytes já processados é conferido e só o trecho novo é
+    processado; nos demais casos o arquivo é processado por inteiro. O cache
+    é regravado sempre que o arquivo é processado.
+
+    'estado["cache"]' indica "usado", "incremental" ou "gravado". Quando a
+    execução anterior também gerou CSV ('com_csv') e nenhuma das mensagens
+    já gravadas mudou, 'estado["csv_anexar"]' traz quantas delas já estão
+    no CSV, para que só as novas sejam acrescentadas.
+    """
+    arquivo_cache = caminho_cache(arquivo_txt)
+    chave = chave_cache(arquivo_txt, encoding)
+    cabecalho, resumo = ler_cabecalho_cache(arquivo_cache)
+
+    if cabecalho and opcoes_compativeis(cabecalho, chave):
+        if (cabecalho.get("tamanho"), cabecalho.get("mtime_ns")) == (chave["tamanho"], chave["mtime_ns"]):
+            # Mesmo tamanho e mesma data de modificação: o arquivo não é lido
+            estado.update(encoding=resumo["encoding"], formato=resumo["formato"], linhas=0, mensagens=0, cache="usado")
+            return ler_cache(arquivo_cache, estado)
+
+        if cabecalho.get("tamanho") == chave["tamanho"]:
+            # Só a data mudou (cópia, extração de novo do .zip): confere o conteúdo
+            chave["sha256"] = calcular_hash_arquivo(arquivo_txt)
+            if cabecalho.get("sha256") == chave["sha256"]:
+                estado.update(encoding=resumo["encoding"], formato=resumo["formato"], linhas=0, mensagens=0, cache="usado")
+                return ler_cache(arquivo_cache, estado)
+
+        elif cabecalho.get("tamanho", 0) < chave["tamanho"] and resumo.get("posicao_ultima") is not None:
+            hash_anterior, chave["sha256"] = hash_prefixo(arquivo_txt, cabecalho["tamanho"])
+            if hash_anterior == cabecalho.get("sha256"):
+                mensagens = iter_mensagens_incremental(arquivo_txt, arquivo_cache, resumo, estado)
+                if mensagens is not None:
+                    estado["cache"] = "incremental"
+                    if resumo.get("csv") and estado["ultima_inalterada"]:
+                        estado["csv_anexar"] = resumo["mensagens"]
+                    # Grava em um arquivo novo: o cache atual ainda está sendo lido
+                    return gravar_cache(mensagens, arquivo_txt, arquivo_cache, chave, estado, com_csv)
+
+    if "sha256" not in chave:
+        chave["sha256"] = calcular_hash_arquivo(arquivo_txt)
+    estado["cache"] = "gravado"
+    mensagens = iter_mensagens(arquivo_txt, estado, encoding, jobs)
+    return gravar_cache(mensagens, arquivo_txt, arquivo_cache, chave, estado, com_csv)
+
+def parse_linhas(linhas, estado, verboso=True, exportacao=None):
+    """
+    Agrupa as linhas (texto já decodificado) em mensagens e as devolve uma a
+    uma. Atualiza 'formato', 'exportacao', 'linhas' e 'mensagens' em 'estado'.
+
+    Sem 'exportacao' (um FormatoExportacao), o formato é detectado nas
+    primeiras LINHAS_AMOSTRA_FORMATO linhas e fixado para o restante do
+    arquivo. Se nenhuma delas for reconhecida, cada linha é testada contra
+    os dois formatos brasileiros (reconhecer_cabecalho). Com exportacao=False
+    (formato já procurado no início do arquivo, sem sucesso), vai direto
+    para reconhecer_cabecalho.
+    """
+    estado.setdefault("formato", None)
+    estado["linhas"] = 0
+    estado.setdefault("mensagens", 0)
+
+    if exportacao is None:
+        linhas = iter(linhas)
+        amostra = list(itertools.islice(linhas, LINHAS_AMOSTRA_FORMATO))
+        exportacao = detectar_formato(amostra)
+        linhas = itertools.chain(amostra, linhas)
+    estado["exportacao"] = exportacao.parametros() if exportacao else None
+
+    if exportacao:
+        reconhecer = exportacao.reconhecer
+        ordem_data = exportacao.ordem_data
+        classificar = classificador_idioma(exportacao.idioma).classificar
+    else:
+        reconhecer = reconhecer_cabecalho
+        ordem_data = "DMA"
+        classificar = classificador_idioma("pt").classificar
+
+    msg_atual = None
+    # Linhas de texto da mensagem em andamento, unidas só quando ela termina
+    texto_atual = []
+
+    for numero_linha, linha_original in enumerate(linhas, 1):
+        estado["linhas"] = numero_linha
+        linha_original = linha_original.strip()
+        if not linha_original:
+            continue
+        
+        # Limpa a linha para análise
+        linha_limpa = limpar_linha(linha_original)
+        if not linha_limpa:
+            continue
+
+        # Verifica se é uma nova mensagem
+        cabecalho = reconhecer(linha_limpa)
+        if cabecalho:
+            # Entrega a mensagem anterior, que agora está completa
+            if msg_atual:
+                msg_atual.texto = "\n".join(texto_atual)
+                estado["mensagens"] += 1
+                yield msg_atual
+                msg_atual = None
+
+            formato, data_str, hora_str, usuario, texto = cabecalho
+
+            # Processa timestamp
+            timestamp_iso, epoch = decodificar_timestamp(data_str, hora_str, ordem_data)
+
+            if formato == "SISTEMA":
+                texto_limpo = texto
+
+                msg_atual = Mensagem("Sistema", "", timestamp_iso, epoch, (), "sistema", numero_linha)
+
+            else:
+                if not estado["formato"]:
+                    estado["formato"] = exportacao.nome if exportacao else formato
+                    if verboso:
+                        print(f"Formato detectado: {exportacao.descricao if exportacao else DESCRICOES_FORMATO[formato]}")
+                
+                # Processa anexos
+                anexos_encontrados = tuple(processar_anexos(texto))
+
+                # Limpa texto
+                texto_limpo = remover_marcas_anexo(texto)
+
+                # Detecta tipo de mensagem
+                tipo_msg = classificar(texto)
+
+                msg_atual = Mensagem(usuario.strip(), "", timestamp_iso, epoch, anexos_encontrados, tipo_msg, numero_linha)
+
+            texto_atual = [texto_limpo] if texto_limpo else []
+            
+        else:
+            # Verifica se realmente deve ser continuação da mensagem anterior
+            if msg_atual and linha_limpa:
+                # Processa anexos na linha, sem repetir os que já existem
+                anexos_linha = processar_anexos(linha_limpa)
+                if anexos_linha:
+                    msg_atual.anexos = tuple(dict.fromkeys(msg_atual.anexos + tuple(anexos_linha)))
+                
+                # Remove referências de anexos da linha
+                linha_texto = remover_marcas_anexo(linha_limpa)
+                
+                if linha_texto:
+                    texto_atual.append(linha_texto)
+
+    # Entrega a última mensagem
+    if msg_atual:
+        msg_atual.texto = "\n".join(texto_atual)
+        estado["mensagens"] += 1
+        yield msg_atual
+
+def diagnosticar_arquivo(arquivo_txt, quantidade=5, encoding=None):
+    """Mostra como as primeiras linhas do arquivo foram interpretadas"""
+    exportacao = detectar_formato_arquivo(arquivo_txt, encoding)
+    if exportacao:
+        print(f"Formato detectado na amostra: {exportacao.descricao} (idioma: {exportacao.idioma})")
+        reconhecer = exportacao.reconhecer
+    else:
+        print("Nenhum formato de cabeçalho reconhecido na amostra")
+        reconhecer = reconhecer_cabecalho
+    print("Verificando primeiras linhas do arquivo:")
+    for i, linha in enumerate(itertools.islice(ler_linhas(arquivo_txt, encoding), quantidade)):
+        linha_original = linha.strip()
+        linha_limpa = limpar_linha(linha_original)
+        print(f"   Linha {i+1}:")
+        print(f"      Original: {repr(linha_original)}")
+        print(f"      Limpa: {repr(linha_limpa)}")
+        cabecalho = reconhecer(linha_limpa)
+        print(f"      É nova msg? {cabecalho is not None}")
+        
+        if cabecalho:
+            print(f"      ✅ {cabecalho[0]} MATCH: {cabecalho[1:]}")
+        else:
+            print(f"      ❌ NÃO MATCHOU nenhum padrão")
+        print()
+
+def parse_whatsapp_txt(arquivo_txt, encoding=None):
+    """
+    LÃª o arquivo .txt exportado do WhatsApp e retorna mensagens.
+    SUPORTA AMBOS FORMATOS:
+    - Formato com colchetes: [DD/MM/AAAA, HH:MM:SS] Usuario: texto
+    - Formato sem colchetes: DD/MM/AAAA HH:MM - Usuario: texto
+    e suas variantes de outros países (veja FormatoExportacao).
+
+    Carrega todas as mensagens em uma lista; para arquivos grandes prefira
+    iter_mensagens(), que processa uma mensagem por vez.
+    """
+    estado = {}
+    mensagens = list(iter_mensagens(arquivo_txt, estado, encoding))
+
+    print(f"Lidas {estado['linhas']} linhas do arquivo")
+    print(f"Processamento concluído: {len(mensagens)} mensagens encontradas")
+    if estado["formato"]:
+        print(f"Formato usado: {estado['formato']}")
+        
+    if not mensagens:
+        print("ATENÇÃO: Nenhuma mensagem foi processada!")
+        diagnosticar_arquivo(arquivo_txt, encoding=estado["encoding"])
+
+    return mensagens
+
+def escrever_linha_csv(writer, msg):
+    """Grava uma mensagem como linha do CSV"""
+    writer.writerow([msg.timestamp, msg.user, msg.texto, msg.info_extra, msg.tipo, msg.linha])
+
+class Conversa:
+    def __init__(self, mensagens, pasta_midias="", usar_servidor=False, porta=8000, pasta_html="",
+                 vincular_anexos=False, deduplicar_anexos=False, manifesto=None, miniaturas=False,
+                 carregamento_lento=True):
+        # 'mensagens' pode ser uma lista ou um iterador (ex.: iter_mensagens);
+        # um iterador só pode ser percorrido uma vez, por isso use processar()
+        # para gerar HTML, CSV e resumo de anexos na mesma passada.
+        self.mensagens = mensagens
+        if isinstance(pasta_midias, str) and pasta_midias and not pasta_midias.endswith(os.sep):
+            pasta_midias += os.sep
+        self.pasta_midias = pasta_midias
+        self.usar_servidor = usar_servidor
+        self.porta = porta
+        self.pasta_html = pasta_html
+        # Com 'vincular_anexos', os anexos copiados viram links físicos quando possível
+        self.vincular_anexos = vincular_anexos
+        # Com 'deduplicar_anexos', conteúdos idênticos são copiados uma vez só
+        self.deduplicar_anexos = deduplicar_anexos
+        # (CSV, JSON) do manifesto de hashes, ligados no cabeçalho do HTML
+        self.manifesto = manifesto
+        # Com 'miniaturas', as imagens copiadas são exibidas por uma miniatura
+        self.miniaturas = miniaturas
+        # Com 'carregamento_lento', as mídias só são buscadas quando necessárias
+        self.carregamento_lento = carregamento_lento
+        # Tabela de anexos, criada a cada passada de processar()
+        self.tabela = None
+        self.materializacao = None
+        self.geracao_miniaturas = None
+        # Preenchidos durante a passada pelas mensagens
+        self.total_mensagens = 0
+        self.anexos_total = 0
+        self.anexos = {}
+        # Epoch da mensagem mais antiga e da mais recente
+        self.inicio = None
+        self.fim = None
+
+    def _renderizar_mensagem(self, msg, classe_usuario):
+        """Gera o HTML de uma única mensagem"""
+        user = msg.user
+        texto = html.escape(msg.texto)
+        tipo = msg.tipo
+
+        # Adiciona classes especÃ­ficas para tipos especiais
+        classes = [classe_usuario]
+        if tipo != "mensagem":
+            classes.append(tipo)
+
+        partes = [f'<div class="msg {" ".join(classes)}">']
+        partes.append(f'<div class="username">{html.escape(user)}</div>')
+        
+        # ConteÃºdo da mensagem
+        if texto.strip():
+            partes.append(f'<div>{texto}</div>')
+        
+        # Anexos
+        for anexo in msg.anexos:
+            partes.append(f'<div class="anexo">{self.tabela.html(anexo)}</div>')
+        
+        partes.append(f'<div class="timestamp">{msg.timestamp}</div>')
+        partes.append('</div>\n')
+        partes.append('<div class="clear"></div>\n')
+        return "".join(partes)
+
+    def _cabecalho_html(self, usuarios, msgs_por_usuario, classes_usuarios):
+        """Monta o início do HTML; chamado depois da passada pelas mensagens"""
+        # Mapeia usuários: o primeiro em ordem alfabética fica à direita,
+        # o segundo à esquerda e os demais seguem o estilo do primeiro
+        seletores_user1 = [".user1"]
+        seletores_user2 = [".user2"]
+        for i, usuario in enumerate(usuarios):
+            seletor = "." + classes_usuarios[usuario]
+            if i == 1:
+                seletores_user2.append(seletor)
+            else:
+                seletores_user1.append(seletor)
+
+        return '''
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Conversa WhatsApp - AnÃ¡lise Investigativa</title>
+            <style>
+                body { 
+                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
+                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                    padding: 20px; 
+                    margin: 0;
+                    min-height: 100vh;
+                }
+                .container {
+                    max-width: 900px;
+                    margin: 0 auto;
+                    background: white;
+                    border-radius: 15px;
+                    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
+                    overflow: hidden;
+                }
+                .header {
+                    background: #075e54;
+                    color: white;
+                    padding: 20px;
+                    text-align: center;
+                }
+                .stats {
+                    background: #f8f9fa;
+                    padding: 20px;
+                    border-bottom: 2px solid #dee2e6;
+                    font-size: 14px;
+                    color: #495057;
+                    font-weight: 500;
+                }
+                .stats-title {
+                    font-size: 16px;
+                    font-weight: bold;
+                    margin-bottom: 10px;
+                    color: #075e54;
+                }
+                .chat-area {
+                    padding: 20px;
+                    background: #e5ddd5;
+                    min-height: 500px;
+                }
+                .msg { 
+                    padding: 12px 18px; 
+                    margin-bottom: 15px; 
+                    border-radius: 15px; 
+                    max-width: 70%; 
+                    clear: both; 
+                    word-wrap: break-word;
+                    box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+                    position: relative;
+                }
+                ''' + ", ".join(seletores_user1) + ''' { 
+                    background: #dcf8c6; 
+                    float: right; 
+                    text-align: left;
+                    border-bottom-right-radius: 5px;
+                }
+                ''' + ", ".join(seletores_user2) + ''' { 
+                    background: white; 
+                    float: left; 
+                    text-align: left;
+                    border-bottom-left-radius: 5px;
+                }
+                .sistema {
+                    background: #fff3cd;
+                    border: 1px solid #ffeaa7;
+                    margin: 10px auto;
+                    text-align: center;
+                    max-width: 80%;
+                    float: none;
+                    font-style: italic;
+                    color: #856404;
+                }
+                .ligacao {
+                    background: #d1ecf1;
+                    border: 1px solid #bee5eb;
+                    color: #0c5460;
+                }
+                .apagada {
+                    background: #f8d7da;
+                    border: 1px solid #f5c6cb;
+                    color: #721c24;
+                    font-style: italic;
+                }
+                .visualizacao_unica, .audio_oculto {
+                    border: 1px dashed #999;
+                    font-style: italic;
+                }
+                .localizacao, .contato {
+                    border-left: 4px solid #25d366;
+                }
+                .username {
+                    font-weight: bold;
+                    color: #075e54;
+                    margin-bottom: 5px;
+                    font-size: 14px;
+                }
+                .timestamp { 
+                    font-size: 11px; 
+                    color: #666; 
+                    margin-top: 8px; 
+                    display: block;
+                    text-align: right;
+                }
+                .clear { clear: both; height: 0; }
+                .anexo {
+                    margin-top: 8px;
+                }
+                @media(max-width:768px) { 
+                    .msg { max-width: 90%; }
+                    body { padding: 10px; }
+                }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>ðŸ"± AnÃ¡lise de Conversa WhatsApp</h1>
+                    <p>Processado em: ''' + datetime.now().strftime("%d/%m/%Y Ã s %H:%M:%S") + '''</p>
+                </div>
+                <div class="stats">
+                    <div class="stats-title">ðŸ"Š EstatÃ­sticas da Conversa:</div>
+                    <strong>Total de mensagens:</strong> ''' + str(self.total_mensagens) + '''<br>
+                    <strong>Total de anexos:</strong> ''' + str(self.anexos_total) + '''<br>
+                    ''' + (f"<strong>Período:</strong> {formatar_epoch(self.inicio)} a {formatar_epoch(self.fim)}<br>" if self.inicio is not None else "") + '''
+                    <strong>Participantes:</strong> ''' + ", ".join(usuarios) + '''<br>
+                    <strong>Mensagens por usuÃ¡rio:</strong> ''' + " | ".join([f"{u}: {c}" for u, c in msgs_por_usuario.items()]) + (
+                    f'<br>\n                    <strong>Manifesto de hashes:</strong> <a href="{quote(os.path.basename(self.manifesto[0]))}">CSV</a> | '
+                    f'<a href="{quote(os.path.basename(self.manifesto[1]))}">JSON</a>' if self.manifesto else "") + '''
+                </div>
+                <div class="chat-area">
+        '''
+
+    def processar(self, destino_html, destino_csv=None, pular_csv=0):
+        """
+        Percorre as mensagens uma única vez, escrevendo o HTML em 'destino_html'
+        e, se informado, o CSV em 'destino_csv' (ambos objetos de arquivo).
+        Ao final, total_mensagens, anexos_total, anexos (nome -> AnexoResolvido,
+        da tabela de anexos, com as ocorrências), materializacao (resumo das
+        cópias para a pasta local) e geracao_miniaturas ficam disponíveis
+        para o resumo.
+
+        Com 'pular_csv', o CSV já contém o cabeçalho e as primeiras
+        'pular_csv' mensagens, e só as seguintes são acrescentadas.
+
+        O corpo da conversa é gravado em um arquivo temporário enquanto as
+        estatísticas são calculadas, e só depois o cabeçalho é escrito.
+        """
+        msgs_por_usuario = {}
+        classes_usuarios = {}
+        self.total_mensagens = 0
+        self.anexos_total = 0
+        # Cada nome de anexo é resolvido (e copiado) uma única vez
+        self.tabela = TabelaAnexos(self.pasta_midias, self.usar_servidor, self.porta, self.pasta_html,
+                                   self.vincular_anexos, self.deduplicar_anexos, self.miniaturas,
+                                   self.carregamento_lento)
+        self.anexos = self.tabela.anexos
+        self.inicio = None
+        self.fim = None
+
+        writer = None
+        if destino_csv is not None:
+            writer = csv.writer(destino_csv)
+            if not pular_csv:
+                writer.writerow(['Timestamp', 'Usuario', 'Texto', 'Anexos', 'Tipo', 'Linha'])
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+', encoding='utf-8') as corpo:
+            for msg in self.mensagens:
+                user = msg.user
+                self.total_mensagens += 1
+                msgs_por_usuario[user] = msgs_por_usuario.get(user, 0) + 1
+                if user not in classes_usuarios:
+                    classes_usuarios[user] = f"p{len(classes_usuarios)}"
+
+                epoch = msg.epoch
+                if epoch is not None:
+                    if self.inicio is None or epoch < self.inicio:
+                        self.inicio = epoch
+                    if self.fim is None or epoch > self.fim:
+                        self.fim = epoch
+
+                for anexo in msg.anexos:
+                    self.anexos_total += 1
+                    self.tabela.registrar(anexo)
+
+                corpo.write(self._renderizar_mensagem(msg, classes_usuarios[user]))
+
+                if writer is not None and self.total_mensagens > pular_csv:
+                    escrever_linha_csv(writer, msg)
+
+            usuarios = sorted(msgs_por_usuario)
+            destino_html.write(self._cabecalho_html(usuarios, msgs_por_usuario, classes_usuarios))
+            corpo.seek(0)
+            shutil.copyfileobj(corpo, destino_html)
+
+        destino_html.write('''
+                </div>
+            </div>''' + (SCRIPT_CARREGAMENTO_LENTO if self.carregamento_lento and self.usar_servidor else "") + '''
+        </body>
+        </html>
+        ''')
+
+        # As cópias dos anexos rodaram junto com a passada; espera as que faltam
+        self.materializacao = self.tabela.materializador.concluir(verboso=sys.stdout.isatty())
+        if self.tabela.gerador_miniaturas is not None:
+            self.geracao_miniaturas = self.tabela.gerador_miniaturas.concluir(verboso=sys.stdout.isatty())
+
+    def gerar_html(self):
+        """Retorna o HTML completo da conversa como string"""
+        saida = io.StringIO()
+        self.processar(saida)
+        return saida.getvalue()
+
+    def exportar_csv(self, arquivo_saida):
+        """Exporta mensagens em formato CSV para anÃ¡lise"""
+        with open(arquivo_saida, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Timestamp', 'Usuario', 'Texto', 'Anexos', 'Tipo', 'Linha'])
+            for msg in self.mensagens:
+                escrever_linha_csv(writer, msg)
+
+# Algoritmos do manifesto de hashes (o MD5 é opcional, com --md5)
+ALGORITMOS_MANIFESTO = ('sha256',)
+
+# Threads do cálculo de hashes (hashlib libera o GIL em blocos grandes)
+THREADS_HASH = 4
+TAMANHO_BLOCO_HASH = 4 * 1024 * 1024
+
+def caminho_cache_hashes(arquivo_txt):
+    """Cache dos hashes já calculados, gravado ao lado da exportação"""
+    return os.path.splitext(arquivo_txt)[0] + "_hashes.cache"
+
+def ler_cache_hashes(arquivo_cache):
+    """
+    Cache de hashes em JSON: caminho -> {"tamanho", "mtime_ns", e um hash
+    por algoritmo}. Vazio se o cache não existir ou for ilegível.
+    """
+    try:
+        with open(arquivo_cache, 'r', encoding='utf-8') as f:
+            hashes = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return hashes if isinstance(hashes, dict) else {}
+
+def gravar_cache_hashes(arquivo_cache, hashes):
+    temporario = arquivo_cache + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, ensure_ascii=False, indent=1)
+    os.replace(temporario, arquivo_cache)
+
+def hashes_em_cache(cache, chave, tamanho, mtime_ns, algoritmos):
+    """
+    Hashes de 'algoritmos' guardados para o arquivo, só se o tamanho e a
+    data de modificação gravados forem os atuais. Valores que não tenham
+    a forma de um hash do algoritmo são ignorados (o arquivo é lido de novo).
+    """
+    entrada = cache.get(chave)
+    if not isinstance(entrada, dict) or entrada.get("tamanho") != tamanho or entrada.get("mtime_ns") != mtime_ns:
+        return {}
+    hashes = {}
+    for algoritmo in algoritmos:
+        digest = entrada.get(algoritmo)
+        if isinstance(digest, str) and re.fullmatch(r'[0-9a-f]+', digest) \
+                and len(digest) == 2 * hashlib.new(algoritmo).digest_size:
+            hashes[algoritmo] = digest
+    return hashes
+
+def identificar_arquivo(caminho_arquivo, pasta_midias=None):
+    """
+    Identificação de um arquivo para o cache de hashes e o manifesto:
+    (chave, tamanho, mtime_ns, modificação legível). Um membro de .zip é
+    identificado pelo .zip e pelo nome do membro.
+    """
+    if isinstance(pasta_midias, MidiasZip):
+        info = pasta_midias.membros[caminho_arquivo]
+        chave = f"{os.path.abspath(pasta_midias.arquivo_zip)}::{info.filename}"
+        modificacao = os.stat(pasta_midias.arquivo_zip).st_mtime_ns
+        return chave, info.file_size, modificacao, "%04d-%02d-%02d %02d:%02d:%02d" % info.date_time
+    estado = os.stat(caminho_arquivo)
+    return (os.path.abspath(caminho_arquivo), estado.st_size, estado.st_mtime_ns,
+            datetime.fromtimestamp(estado.st_mtime).strftime("%Y-%m-%d %H:%M:%S"))
+
+def calcular_hashes(caminho_arquivo, algoritmos, pasta_midias=None):
+    """Hashes de 'algoritmos' em uma única leitura, em blocos grandes reaproveitando o mesmo buffer"""
+    hs = [hashlib.new(algoritmo) for algoritmo in algoritmos]
+    buffer = bytearray(TAMANHO_BLOCO_HASH)
+    visao = memoryview(buffer)
+    if isinstance(pasta_midias, MidiasZip):
+        abrir = lambda: pasta_midias.abrir(caminho_arquivo)
+    else:
+        abrir = lambda: open(caminho_arquivo, 'rb', buffering=0)
+    with abrir() as f:
+        while True:
+            lidos = f.readinto(buffer)
+            if not lidos:
+                break
+            for h in hs:
+                h.update(visao[:lidos])
+    return {algoritmo: h.hexdigest() for algoritmo, h in zip(algoritmos, hs)}
+
+def gerar_manifesto(arquivo_txt, anexos, pasta_midias, arquivo_saida_base, algoritmos=ALGORITMOS_MANIFESTO,
+                    usar_cache=True, threads=THREADS_HASH, hashes_conhecidos=None):
+    """
+    Manifesto de hashes para a cadeia de custódia: a exportação e cada
+    anexo localizado ('anexos': AnexoResolvido da tabela de anexos). Cada
+    arquivo é lido uma vez, em um pool de threads; os hashes ficam no cache
+    _hashes.cache (JSON), por caminho, com o tamanho e a data de modificação,
+    e uma nova execução só lê os arquivos novos ou alterados. 'hashes_conhecidos'
+    (caminho -> SHA-256) aproveita hashes já calculados nesta execução.
+    Grava arquivo_saida_base + "_manifesto.csv" e "_manifesto.json" e
+    retorna o resumo.
+    """
+    inicio = time.perf_counter()
+    arquivo_cache = caminho_cache_hashes(arquivo_txt)
+    cache = ler_cache_hashes(arquivo_cache) if usar_cache else {}
+    hashes_conhecidos = hashes_conhecidos or {}
+
+    # (tipo, nome, caminho, origem): a exportação e os anexos encontrados
+    itens = [("conversa", os.path.basename(arquivo_txt), arquivo_txt, None)]
+    itens += [("anexo", anexo.nome, anexo.caminho, pasta_midias) for anexo in anexos if anexo.caminho]
+
+    # Identifica cada arquivo distinto e separa os que precisam ser lidos
+    identificados = {}
+    pendentes = []
+    erros = []
+    for _, _, caminho, origem in itens:
+        if caminho in identificados:
+            continue
+        try:
+            chave, tamanho, mtime_ns, modificacao = identificar_arquivo(caminho, origem)
+        except OSError as e:
+            erros.append((str(caminho), str(e)))
+            identificados[caminho] = None
+            continue
+        hashes = hashes_em_cache(cache, chave, tamanho, mtime_ns, algoritmos)
+        if 'sha256' in algoritmos and 'sha256' not in hashes and caminho in hashes_conhecidos:
+            hashes['sha256'] = hashes_conhecidos[caminho]
+        identificados[caminho] = (chave, tamanho, mtime_ns, modificacao, hashes)
+        if len(hashes) < len(algoritmos):
+            pendentes.append((caminho, origem))
+
+    lidos = 0
+    bytes_lidos = 0
+    if pendentes:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            futuros = {executor.submit(calcular_hashes, caminho, algoritmos, origem): caminho
+                       for caminho, origem in pendentes}
+            for futuro in concurrent.futures.as_completed(futuros):
+                caminho = futuros[futuro]
+                try:
+                    calculados = futuro.result()
+                except ERROS_LEITURA_ANEXO as e:
+                    erros.append((str(caminho), str(e)))
+                    identificados[caminho] = None
+                    continue
+                chave, tamanho, mtime_ns, _, hashes = identificados[caminho]
+                hashes.update(calculados)
+                lidos += 1
+                bytes_lidos += tamanho
+                anteriores = cache.get(chave)
+                if not isinstance(anteriores, dict) or \
+                        (anteriores.get("tamanho"), anteriores.get("mtime_ns")) != (tamanho, mtime_ns):
+                    anteriores = {}
+                cache[chave] = {**anteriores, "tamanho": tamanho, "mtime_ns": mtime_ns, **calculados}
+
+    if usar_cache and pendentes:
+        try:
+            gravar_cache_hashes(arquivo_cache, cache)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o cache de hashes: {e}")
+
+    registros = []
+    for tipo, nome, caminho, _ in itens:
+        identificado = identificados[caminho]
+        if identificado is None:
+            continue
+        _, tamanho, _, modificacao, hashes = identificado
+        registro = {"tipo": tipo, "nome": nome, "caminho": str(caminho), "tamanho": tamanho,
+                    "modificacao": modificacao}
+        registro.update(hashes)
+        registros.append(registro)
+
+    arquivo_csv = arquivo_saida_base + "_manifesto.csv"
+    arquivo_json = arquivo_saida_base + "_manifesto.json"
+    with open(arquivo_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Tipo', 'Nome', 'Caminho', 'Tamanho', 'Modificacao'] + [a.upper() for a in algoritmos])
+        for registro in registros:
+            writer.writerow([registro["tipo"], registro["nome"], registro["caminho"], registro["tamanho"],
+                             registro["modificacao"]] + [registro[a] for a in algoritmos])
+    with open(arquivo_json, 'w', encoding='utf-8') as f:
+        json.dump({"gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                   "exportacao": str(arquivo_txt),
+                   "algoritmos": list(algoritmos),
+                   "arquivos": registros}, f, ensure_ascii=False, indent=2)
+
+    return {
+        "csv": arquivo_csv,
+        "json": arquivo_json,
+        "arquivos": len(registros),
+        "lidos": lidos,
+        "bytes_lidos": bytes_lidos,
+        "erros": erros,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+class PerfilEtapas:
+    """
+    Modo --profile: conta chamadas, tempo, volume (bytes ou caracteres de
+    entrada) e pico de memória de cada etapa do processamento. As funções de
+    cada etapa são trocadas por versões medidas (veja ativar_perfil). O tempo
+    de uma etapa inclui o das etapas chamadas por ela; o pico de memória é o
+    quanto a memória alocada (tracemalloc) subiu acima do início da chamada.
+    Como esse pico é do processo inteiro, com o perfil ativo as cópias de
+    anexos deixam de rodar em threads, em paralelo às demais etapas, e são
+    feitas uma a uma ao final da passada (veja MaterializadorAnexos.sequencial).
+    """
+    def __init__(self):
+        # etapa -> [chamadas, segundos, volume, pico de memória em bytes]
+        self.etapas = {}
+        # Maior pico já observado pelas chamadas internas de cada nível, por thread
+        self._local = threading.local()
+        self._trava = threading.Lock()
+        self.inicio = time.perf_counter()
+        tracemalloc.start()
+
+    def _picos_internos(self):
+        picos = getattr(self._local, "picos", None)
+        if picos is None:
+            picos = self._local.picos = []
+        return picos
+
+    def instrumentar(self, funcao, etapa, volume=None):
+        """Versão medida de 'funcao'; 'volume(args, resultado)' informa o volume processado"""
+        totais = self.etapas.setdefault(etapa, [0, 0.0, 0, 0])
+        trava = self._trava
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            picos_internos = self._picos_internos()
+            # Preserva o pico já atingido pelo nível de fora antes de zerá-lo
+            memoria_inicial, pico = tracemalloc.get_traced_memory()
+            if picos_internos and pico > picos_internos[-1]:
+                picos_internos[-1] = pico
+            tracemalloc.reset_peak()
+            picos_internos.append(0)
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args, **kwargs)
+            finally:
+                tempo = time.perf_counter() - inicio
+                pico = max(tracemalloc.get_traced_memory()[1], picos_internos.pop())
+                if picos_internos and pico > picos_internos[-1]:
+                    picos_internos[-1] = pico
+                with trava:
+                    totais[0] += 1
+                    totais[1] += tempo
+                    if pico - memoria_inicial > totais[3]:
+                        totais[3] = pico - memoria_inicial
+            if volume is not None:
+                quantidade = volume(args, resultado)
+                with trava:
+                    totais[2] += quantidade
+            return resultado
+        return medida
+
+    def relatorio(self):
+        """Etapas medidas, na ordem do pipeline, como lista de dicionários"""
+        return [{"etapa": etapa, "chamadas": chamadas, "segundos": round(segundos, 6),
+                 "volume": volume, "pico_memoria": pico}
+                for etapa, (chamadas, segundos, volume, pico) in self.etapas.items() if chamadas]
+
+    def imprimir(self):
+        print(f"\nPerfil de execução ({time.perf_counter() - self.inicio:.2f}s no total):")
+        print(f"   {'Etapa':<28} {'Chamadas':>10} {'Tempo (s)':>10} {'Volume':>14} {'Pico de memória':>16}")
+        for linha in self.relatorio():
+            print(f"   {linha['etapa']:<28} {linha['chamadas']:>10} {linha['segundos']:>10.3f} "
+                  f"{linha['volume']:>14} {linha['pico_memoria'] / 1024:>13.1f} KiB")
+
+    def gravar_json(self, arquivo_saida):
+        with open(arquivo_saida, 'w', encoding='utf-8') as f:
+            json.dump({"segundos_total": round(time.perf_counter() - self.inicio, 6), "etapas": self.relatorio()},
+                      f, ensure_ascii=False, indent=2)
+
+def _tamanho_argumento(posicao):
+    """Volume de uma etapa: tamanho do argumento na 'posicao'"""
+    return lambda args, resultado: len(args[posicao])
+
+def _tamanho_resultado(args, resultado):
+    return len(resultado)
+
+def _tamanho_copia(args, resultado):
+    return os.path.getsize(args[1])
+
+# Etapas medidas no modo --profile: (objeto, atributo, nome da etapa, volume)
+ETAPAS_PERFIL = [
+    ("modulo", "processar_conversa", "total da conversa", lambda args, resultado: os.path.getsize(args[0])),
+    ("modulo", "decodificar_linha", "decodificação", _tamanho_argumento(0)),
+    ("modulo", "limpar_linha", "limpar_linha", _tamanho_argumento(0)),
+    ("modulo", "reconhecer_cabecalho", "cabeçalho", _tamanho_argumento(0)),
+    ("FormatoExportacao", "reconhecer", "cabeçalho", _tamanho_argumento(1)),
+    ("modulo", "processar_anexos", "processar_anexos", _tamanho_argumento(0)),
+    ("modulo", "decodificar_timestamp", "timestamp", None),
+    ("ClassificadorTipos", "classificar", "classificação", _tamanho_argumento(1)),
+    ("TabelaAnexos", "_resolver", "resolução de anexos", None),
+    ("modulo", "verificar_arquivo_existe", "verificar_arquivo_existe", None),
+    ("modulo", "gerar_html_anexo", "gerar_html_anexo", _tamanho_resultado),
+    ("modulo", "copiar_anexo", "cópia de anexos", _tamanho_copia),
+    ("Conversa", "_renderizar_mensagem", "montagem do HTML", _tamanho_resultado),
+    ("Conversa", "_cabecalho_html", "montagem do HTML", _tamanho_resultado),
+    ("modulo", "escrever_linha_csv", "escrita do CSV", None),
+]
+
+def ativar_perfil():
+    """
+    Troca as funções de ETAPAS_PERFIL pelas versões medidas e retorna o
+    PerfilEtapas. Só mede o processo atual: o trabalho feito em outros
+    processos (--jobs, --lote) não entra no perfil.
+    """
+    perfil = PerfilEtapas()
+    MaterializadorAnexos.sequencial = True
+    modulo = sys.modules[__name__]
+    for nome_objeto, atributo, etapa, volume in ETAPAS_PERFIL:
+        objeto = modulo if nome_objeto == "modulo" else getattr(modulo, nome_objeto)
+        setattr(objeto, atributo, perfil.instrumentar(getattr(objeto, atributo), etapa, volume))
+    return perfil
+
+def processar_conversa(arquivo_txt, pasta_midias="", exportar_csv=False, usar_servidor=False, standalone=False,
+                       porta=8000, encoding=None, jobs=1, usar_cache=True,
+                       vincular_anexos=False, deduplicar_anexos=False, manifesto=False,
+                       algoritmos_manifesto=ALGORITMOS_MANIFESTO, miniaturas=False, carregamento_lento=True):
+    """
+    Processa uma exportação: lê as mensagens (ou aproveita o cache), gera o
+    HTML e, se pedido, o CSV ao lado do arquivo .txt. Retorna um dicionário
+    com o resumo do processamento (contagens, anexos e tempo gasto). Se
+    nenhuma mensagem for encontrada, os arquivos gerados são removidos.
+
+    'arquivo_txt' pode ser a exportação .zip; sem 'pasta_midias', as mídias
+    são procuradas no próprio .zip. 'pasta_midias' também pode ser um .zip.
+    Com 'vincular_anexos', os anexos da pasta local viram links físicos
+    para os originais quando possível, em vez de cópias; com
+    'deduplicar_anexos', anexos de conteúdo idêntico são copiados uma vez só.
+    Com 'manifesto', grava o manifesto de hashes da exportação e dos anexos.
+    Com 'miniaturas', as imagens copiadas são exibidas por miniaturas. Sem
+    'carregamento_lento', o HTML carrega todas as mídias ao abrir.
+    """
+    inicio = time.perf_counter()
+    if not pasta_midias and e_arquivo_zip(arquivo_txt):
+        pasta_midias = arquivo_txt
+    pasta_midias = abrir_midias(pasta_midias)
+    try:
+        # Define o modo dos anexos: servidor local ou cópia para pasta local
+        pasta_html_base = ""
+        if standalone or (not usar_servidor and pasta_midias):
+            pasta_html_base = os.path.dirname(os.path.abspath(arquivo_txt))
+
+        arquivo_saida_html = os.path.splitext(arquivo_txt)[0] + "_conversa.html"
+        arquivo_saida_csv = os.path.splitext(arquivo_txt)[0] + "_conversa.csv" if exportar_csv else None
+
+        # Uma única passada: lê (ou aproveita o cache), gera HTML, CSV e contabiliza anexos
+        estado = {}
+        if usar_cache:
+            mensagens = iter_mensagens_cache(arquivo_txt, estado, encoding, jobs,
+                                             com_csv=bool(arquivo_saida_csv))
+        else:
+            mensagens = iter_mensagens(arquivo_txt, estado, encoding, jobs)
+
+        # Exportação reenviada com mensagens novas: o CSV anterior só recebe as novas linhas
+        pular_csv = 0
+        if arquivo_saida_csv and estado.get("csv_anexar") and os.path.isfile(arquivo_saida_csv):
+            pular_csv = estado["csv_anexar"]
+
+        base_saida = os.path.splitext(arquivo_txt)[0]
+        arquivos_manifesto = (base_saida + "_manifesto.csv", base_saida + "_manifesto.json") if manifesto else None
+        gerador = Conversa(mensagens, pasta_midias or "", usar_servidor, porta, pasta_html_base, vincular_anexos,
+                           deduplicar_anexos, arquivos_manifesto, miniaturas, carregamento_lento)
+        with open(arquivo_saida_html, "w", encoding="utf-8") as f_html, \
+                (open(arquivo_saida_csv, 'a' if pular_csv else 'w', newline='', encoding='utf-8') if arquivo_saida_csv else contextlib.nullcontext()) as f_csv:
+            gerador.processar(f_html, f_csv, pular_csv)
+
+        if gerador.total_mensagens == 0:
+            for arquivo_saida in (arquivo_saida_html, arquivo_saida_csv):
+                if arquivo_saida and os.path.exists(arquivo_saida):
+                    os.remove(arquivo_saida)
+            arquivo_saida_html = arquivo_saida_csv = None
+
+        # O resumo dos anexos vem da tabela montada durante a passada: cada nome
+        # citado já foi localizado (e copiado) uma única vez
+        anexos = gerador.anexos
+        arquivo_saida_anexos = None
+        if arquivo_saida_csv and anexos:
+            arquivo_saida_anexos = base_saida + "_anexos.csv"
+            gerador.tabela.gravar_csv(arquivo_saida_anexos)
+
+        # Hashes da exportação e de cada anexo localizado, para a cadeia de custódia
+        resumo_manifesto = None
+        if manifesto and gerador.total_mensagens:
+            resumo_manifesto = gerar_manifesto(arquivo_txt, anexos.values(), pasta_midias, base_saida,
+                                               algoritmos_manifesto, usar_cache, hashes_conhecidos=gerador.tabela.hashes)
+
+        return {
+            "arquivo": arquivo_txt,
+            "pasta_midias": pasta_midias,
+            "pasta_html": pasta_html_base,
+            "html": arquivo_saida_html,
+            "csv": arquivo_saida_csv,
+            "csv_anexos": arquivo_saida_anexos,
+            "linhas": estado["linhas"],
+            "encoding": estado["encoding"],
+            "formato": estado["formato"],
+            "cache": estado.get("cache"),
+            "mensagens": gerador.total_mensagens,
+            "mensagens_novas": gerador.total_mensagens - estado.get("mensagens_anteriores", 0),
+            "anexos_total": gerador.anexos_total,
+            "anexos": anexos,
+            "anexos_faltando": [nome for nome, anexo in anexos.items() if not anexo.caminho],
+            "anexos_ambiguos": {nome: anexo.candidatos for nome, anexo in anexos.items() if anexo.candidatos},
+            "materializacao": gerador.materializacao,
+            "miniaturas": gerador.geracao_miniaturas,
+            "manifesto": resumo_manifesto,
+            "tempo": time.perf_counter() - inicio,
+        }
+    finally:
+        # O .zip das mídias é reaberto sob demanda se voltar a ser usado (ex.: --servidor)
+        if isinstance(pasta_midias, MidiasZip):
+            pasta_midias.fechar()
+
+# Nomes usuais da pasta de mídias ao lado da exportação (comparados sem maiúsculas)
+NOMES_PASTA_MIDIAS = ("midias", "mídias", "anexos", "media", "mídia", "midia")
+
+# Linhas iniciais examinadas para decidir se um .txt é uma exportação do WhatsApp
+LINHAS_VERIFICADAS_EXPORTACAO = 20
+
+def e_exportacao_whatsapp(arquivo_txt):
+    """Verifica se alguma das primeiras linhas do arquivo (ou do .zip) é um cabeçalho de mensagem"""
+    try:
+        return detectar_formato_arquivo(arquivo_txt, linhas=LINHAS_VERIFICADAS_EXPORTACAO) is not None
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return False
+
+def localizar_pasta_midias(arquivo_txt):
+    """
+    Procura a pasta de mídias de uma exportação: uma subpasta com o nome do
+    arquivo ou com um dos NOMES_PASTA_MIDIAS; senão a própria pasta do .txt,
+    se ela contiver arquivos com extensão de anexo. Retorna "" se não achar.
+    Uma exportação .zip usa as mídias compactadas junto com a conversa.
+    """
+    if e_arquivo_zip(arquivo_txt):
+        return arquivo_txt
+
+    pasta = os.path.dirname(os.path.abspath(arquivo_txt))
+    nome_base = os.path.splitext(os.path.basename(arquivo_txt))[0].casefold()
+    candidatos = (nome_base, nome_base + "_midias") + NOMES_PASTA_MIDIAS
+
+    with os.scandir(pasta) as entradas:
+        entradas = list(entradas)
+    subpastas = {entrada.name.casefold(): entrada.path for entrada in entradas if entrada.is_dir()}
+    for nome in candidatos:
+        if nome in subpastas:
+            return subpastas[nome]
+
+    extensoes = tuple('.' + extensao.lower() for extensao in EXTENSOES_ANEXO)
+    if any(entrada.is_file() and entrada.name.lower().endswith(extensoes) for entrada in entradas):
+        return pasta
+    return ""
+
+def encontrar_conversas(raiz):
+    """Lista, em ordem, os pares (arquivo .txt ou .zip, pasta de mídias) abaixo de 'raiz'"""
+    pares = []
+    for pasta, subpastas, arquivos in os.walk(raiz):
+        subpastas.sort()
+        # A pasta de cópia dos anexos gerada pelo próprio script não contém exportações
+        if "anexos_conversa" in subpastas:
+            subpastas.remove("anexos_conversa")
+        for nome in sorted(arquivos):
+            if not nome.lower().endswith((".txt", ".zip")):
+                continue
+            arquivo_txt = os.path.join(pasta, nome)
+            if e_exportacao_whatsapp(arquivo_txt):
+                pares.append((arquivo_txt, localizar_pasta_midias(arquivo_txt)))
+    return pares
+
+def processar_caso(arquivo_txt, pasta_midias, opcoes):
+    """
+    Processa uma conversa do lote em um processo do pool. A saída de texto
+    do processamento é descartada e erros são devolvidos no próprio resumo,
+    para que uma exportação com problema não interrompa as demais.
+    """
+    inicio = time.perf_counter()
+    configurar_extensoes_anexo(opcoes.pop("extensoes"))
+    configurar_regras_tipo(opcoes.pop("regras"))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            resumo = processar_conversa(arquivo_txt, pasta_midias, **opcoes)
+        resumo["erro"] = ""
+        resumo["pasta_midias"] = str(resumo["pasta_midias"])
+    except Exception as e:
+        resumo = {"arquivo": arquivo_txt, "pasta_midias": pasta_midias, "mensagens": 0, "anexos_total": 0,
+                  "anexos_faltando": [], "erro": f"{type(e).__name__}: {e}", "tempo": time.perf_counter() - inicio}
+    # O dicionário de anexos pode ser grande e não é usado no resumo do lote
+    resumo.pop("anexos", None)
+    return resumo
+
+def processar_grupo(casos, opcoes):
+    """
+    Processa, uma após a outra, as conversas do lote que gravam na mesma
+    pasta (e na mesma anexos_conversa/), para que não copiem os mesmos
+    anexos ao mesmo tempo. Retorna a lista de (índice, resumo).
+    """
+    return [(i, processar_caso(arquivo_txt, pasta_midias, dict(opcoes))) for i, arquivo_txt, pasta_midias in casos]
+
+def gravar_resumo_lote(resumos, arquivo_saida):
+    """Grava o resumo consolidado do lote em CSV, uma linha por conversa"""
+    with open(arquivo_saida, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Arquivo', 'Pasta de mídias', 'Mensagens', 'Linhas', 'Formato', 'Codificação', 'Cache',
+                         'Anexos', 'Anexos não encontrados', 'Anexos ambíguos', 'Tempo (s)', 'HTML', 'CSV', 'Erro'])
+        for resumo in resumos:
+            writer.writerow([resumo["arquivo"], resumo["pasta_midias"], resumo["mensagens"], resumo.get("linhas", ""),
+                             resumo.get("formato") or "", resumo.get("encoding") or "", resumo.get("cache") or "",
+                             resumo["anexos_total"], len(resumo["anexos_faltando"]),
+                             len(resumo.get("anexos_ambiguos", ())), f'{resumo["tempo"]:.2f}',
+                             resumo.get("html") or "", resumo.get("csv") or "", resumo["erro"]])
+
+def processar_lote(raiz, processos=None, **opcoes):
+    """
+    Encontra as exportações abaixo de 'raiz' e processa cada uma em um pool
+    de até 'processos' processos (padrão: número de CPUs). As 'opcoes' são
+    repassadas a processar_conversa. Retorna os resumos na ordem dos arquivos
+    e grava o resumo consolidado em 'raiz/resumo_lote.csv'.
+    """
+    pares = encontrar_conversas(raiz)
+    if not pares:
+        print(f"Nenhuma exportação do WhatsApp encontrada em: {raiz}")
+        return []
+
+    # Conversas da mesma pasta (ex.: x.txt e x.zip) compartilham anexos_conversa/
+    # e vão juntas para o mesmo processo
+    grupos = {}
+    for i, (arquivo_txt, pasta_midias) in enumerate(pares):
+        grupos.setdefault(os.path.dirname(os.path.abspath(arquivo_txt)), []).append((i, arquivo_txt, pasta_midias))
+
+    processos = max(1, min(processos or os.cpu_count() or 1, len(grupos)))
+    print(f"Encontradas {len(pares)} conversas; processando em {processos} processos...")
+
+    inicio = time.perf_counter()
+    resumos = [None] * len(pares)
+    concluidos = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = [
+            executor.submit(processar_grupo, casos, dict(opcoes, extensoes=EXTENSOES_ANEXO, regras=REGRAS_TIPO))
+            for casos in grupos.values()
+        ]
+        for futuro in concurrent.futures.as_completed(futuros):
+            for i, resumo in futuro.result():
+                concluidos += 1
+                resumos[i] = resumo
+                situacao = f"ERRO ({resumo['erro']})" if resumo["erro"] else \
+                    f"{resumo['mensagens']} mensagens, {resumo['anexos_total']} anexos ({len(resumo['anexos_faltando'])} não encontrados, " \
+                    f"{len(resumo['anexos_ambiguos'])} ambíguos)"
+                print(f"   [{concluidos}/{len(pares)}] {resumo['arquivo']}: {situacao} em {resumo['tempo']:.1f}s")
+
+    arquivo_resumo = os.path.join(raiz, "resumo_lote.csv")
+    gravar_resumo_lote(resumos, arquivo_resumo)
+
+    print(f"\nLote concluído em {time.perf_counter() - inicio:.1f}s")
+    print(f"   Conversas: {len(resumos)} ({sum(1 for r in resumos if r['erro'])} com erro)")
+    print(f"   Mensagens: {sum(r['mensagens'] for r in resumos)}")
+    print(f"   Anexos: {sum(r['anexos_total'] for r in resumos)} "
+          f"({sum(len(r['anexos_faltando']) for r in resumos)} não encontrados, "
+          f"{sum(len(r.get('anexos_ambiguos', ())) for r in resumos)} ambíguos)")
+    print(f"Resumo do lote gravado em: {arquivo_resumo}")
+    return resumos
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Conversor de conversas WhatsApp para HTML com suporte a anexos',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Exemplos de uso:
+  python whatsapp_converter.py conversa.txt
+  python whatsapp_converter.py conversa.txt --pasta-midias ./anexos/
+  python whatsapp_converter.py conversa.txt --pasta-midias ./anexos/ --servidor
+  python whatsapp_converter.py "WhatsApp Chat.zip" --standalone
+  python whatsapp_converter.py ./exportacoes/ --lote --exportar-csv
+        '''
+    )
+    
+    parser.add_argument('arquivo', help='Arquivo .txt ou .zip da conversa exportada do WhatsApp (ou pasta, com --lote)')
+    parser.add_argument('--pasta-midias', help='Pasta (ou arquivo .zip) contendo os arquivos de mÃ­dia e anexos')
+    parser.add_argument('--exportar-csv', action='store_true', help='Exportar tambÃ©m em formato CSV')
+    parser.add_argument('--servidor', action='store_true', help='Iniciar servidor web local para visualizar anexos')
+    parser.add_argument('--standalone', action='store_true', help='Criar versÃ£o standalone copiando anexos localmente')
+    parser.add_argument('--porta', type=int, default=8000, help='Porta do servidor local (padrÃ£o: 8000)')
+    parser.add_argument('--jobs', type=int, default=1, help='Processos usados na leitura de arquivos grandes (padrão: 1)')
+    parser.add_argument('--hardlink', action='store_true',
+                        help='Na cópia local dos anexos, criar links físicos para os originais quando possível '
+                             '(os arquivos ficam compartilhados: não edite os anexos copiados)')
+    parser.add_argument('--manifesto', action='store_true',
+                        help='Gravar o manifesto de hashes (SHA-256) da exportação e dos anexos em CSV e JSON')
+    parser.add_argument('--md5', action='store_true', help='Incluir também o MD5 no manifesto de hashes')
+    parser.add_argument('--miniaturas', action='store_true',
+                        help='Exibir as imagens copiadas por miniaturas (requer Pillow); o clique abre o original')
+    parser.add_argument('--carregamento-imediato', action='store_true',
+                        help='Carregar todas as mídias ao abrir o HTML (padrão: só quando aparecem na tela ou são clicadas)')
+    parser.add_argument('--deduplicar-anexos', action='store_true',
+                        help='Na cópia local dos anexos, copiar uma vez só os arquivos de conteúdo idêntico')
+    parser.add_argument('--extensoes-anexo', help='Extensões reconhecidas como anexo, separadas por vírgula (ex.: pdf,jpg,heic)')
+    parser.add_argument('--sem-cache', action='store_true', help='Não usar nem gravar o cache da conversa processada')
+    parser.add_argument('--encoding', help='Codificação do arquivo (padrão: detecção automática)')
+    parser.add_argument('--regras-tipo', help='Arquivo JSON com regras de classificação das mensagens por idioma')
+    parser.add_argument('--profile', action='store_true', help='Medir tempo, chamadas, volume e memória de cada etapa (mais lento)')
+    parser.add_argument('--profile-json', help='Gravar também o perfil do --profile neste arquivo JSON')
+    parser.add_argument('--lote', action='store_true', help='Processar todas as exportações encontradas na pasta informada')
+    parser.add_argument('--processos-lote', type=int, help='Conversas processadas ao mesmo tempo no modo --lote (padrão: número de CPUs)')
+    
+    args = parser.parse_args()
+
+    if args.profile or args.profile_json:
+        perfil = ativar_perfil()
+        # A tabela sai ao final da execução, inclusive em erros e após parar o servidor
+        atexit.register(perfil.imprimir)
+        if args.profile_json:
+            atexit.register(perfil.gravar_json, args.profile_json)
+        if args.jobs > 1 or args.lote:
+            print("Aviso: o perfil mede só o processo principal; use --jobs 1 e sem --lote para medir todas as etapas")
+
+    algoritmos_manifesto = ALGORITMOS_MANIFESTO + (('md5',) if args.md5 else ())
+    if args.md5 and not args.manifesto:
+        print("Aviso: --md5 só tem efeito junto com --manifesto")
+    if args.miniaturas and Image is None:
+        print("Aviso: Pillow não instalado (pip install pillow); as imagens serão exibidas sem miniaturas")
+    elif args.miniaturas and args.servidor and not args.standalone:
+        print("Aviso: --miniaturas só se aplica à cópia local dos anexos, não ao --servidor")
+
+    # VerificaÃ§Ãµes
+    if args.lote:
+        if not os.path.isdir(args.arquivo):
+            print(f"Pasta não encontrada: {args.arquivo}")
+            sys.exit(1)
+    elif not os.path.isfile(args.arquivo):
+        print(f"Arquivo nÃ£o encontrado: {args.arquivo}")
+        sys.exit(1)
+
+    if args.encoding:
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            print(f"Codificação desconhecida: {args.encoding}")
+            sys.exit(1)
+
+    if args.extensoes_anexo:
+        configurar_extensoes_anexo(e.strip() for e in args.extensoes_anexo.split(",") if e.strip())
+
+    if args.regras_tipo:
+        try:
+            configurar_regras_tipo(carregar_regras_tipo(args.regras_tipo))
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível carregar as regras de tipo ({args.regras_tipo}): {e}")
+            sys.exit(1)
+
+    if args.lote:
+        # Cada conversa usa a pasta de mídias encontrada ao lado dela; o
+        # paralelismo é entre conversas, e o servidor local não se aplica
+        if args.pasta_midias or args.servidor:
+            print("No modo --lote, --pasta-midias e --servidor são ignorados")
+        opcoes = dict(exportar_csv=args.exportar_csv, standalone=args.standalone, encoding=args.encoding,
+                      usar_cache=not args.sem_cache, vincular_anexos=args.hardlink,
+                      deduplicar_anexos=args.deduplicar_anexos, manifesto=args.manifesto,
+                      algoritmos_manifesto=algoritmos_manifesto, miniaturas=args.miniaturas,
+                      carregamento_lento=not args.carregamento_imediato)
+        processar_lote(args.arquivo, args.processos_lote, **opcoes)
+        return
+
+    # Exportação .zip: as mídias são lidas do próprio arquivo, sem extraí-lo
+    if not args.pasta_midias and e_arquivo_zip(args.arquivo):
+        args.pasta_midias = args.arquivo
+
+    if args.pasta_midias and not os.path.isdir(args.pasta_midias) and not e_arquivo_zip(args.pasta_midias):
+        print(f"Pasta de mÃ­dias nÃ£o encontrada: {args.pasta_midias}")
+        print("Continuando sem anexos...")
+        args.pasta_midias = ""
+    pasta_midias = abrir_midias(args.pasta_midias or "")
+
+    print(f"Lendo arquivo: {args.arquivo}")
+    if isinstance(pasta_midias, MidiasZip):
+        print(f"Mídias lidas do arquivo compactado: {pasta_midias}")
+        print(f"Encontrados {len(pasta_midias)} arquivos no .zip")
+    elif pasta_midias:
+        print(f"Pasta de mÃ­dias: {args.pasta_midias}")
+        arquivos_midias = len(indice_midias(args.pasta_midias))
+        print(f"Encontrados {arquivos_midias} arquivos na pasta de mÃ­dias")
+
+    try:
+        resumo = processar_conversa(args.arquivo, pasta_midias, args.exportar_csv, args.servidor,
+                                    args.standalone, args.porta, args.encoding, args.jobs,
+                                    usar_cache=not args.sem_cache, vincular_anexos=args.hardlink,
+                                    deduplicar_anexos=args.deduplicar_anexos, manifesto=args.manifesto,
+                                    algoritmos_manifesto=algoritmos_manifesto, miniaturas=args.miniaturas,
+                                    carregamento_lento=not args.carregamento_imediato)
+        arquivo_saida_html = resumo["html"]
+        arquivo_saida_csv = resumo["csv"]
+        pasta_html_base = resumo["pasta_html"]
+
+        print(f"Lidas {resumo['linhas']} linhas do arquivo (codificação: {resumo['encoding']})")
+        if resumo["cache"] == "usado":
+            print(f"Mensagens carregadas do cache: {caminho_cache(args.arquivo)}")
+        elif resumo["cache"] == "incremental":
+            print(f"Exportação ampliada: {resumo['mensagens_novas']} mensagens novas processadas (cache: {caminho_cache(args.arquivo)})")
+        print(f"Processadas {resumo['mensagens']} mensagens")
+        if resumo["formato"]:
+            print(f"Formato usado: {resumo['formato']}")
+        
+        if resumo["mensagens"] == 0:
+            diagnosticar_arquivo(args.arquivo, encoding=resumo["encoding"])
+            print("ERRO: Nenhuma mensagem foi processada!")
+            print("PossÃ­veis causas:")
+            print("   â€¢ Formato do arquivo diferente do esperado")
+            print("   â€¢ Problema de codificaÃ§Ã£o de caracteres")
+            print("   â€¢ Arquivo corrompido ou vazio")
+            return
+        
+        # Resumo dos anexos encontrados
+        anexos_encontrados = resumo["anexos_total"]
+        if anexos_encontrados > 0:
+            print(f"Encontrados {anexos_encontrados} anexos nas mensagens:")
+            for nome, anexo in resumo["anexos"].items():
+                status = anexo.status
+                if anexo.status == STATUS_AMBIGUO:
+                    status = f"{STATUS_AMBIGUO}, usado {anexo.nome_arquivo}"
+                print(f"   - {nome} â†' {status}")
+            if resumo["anexos_ambiguos"]:
+                print(f"Atenção: {len(resumo['anexos_ambiguos'])} anexos não têm arquivo com o nome exato e "
+                      f"foram associados ao mais parecido entre vários candidatos:")
+                for anexo, (quantidade, candidatos) in resumo["anexos_ambiguos"].items():
+                    nomes = ", ".join(os.path.basename(candidato) for candidato in candidatos)
+                    print(f"   - {anexo}: {quantidade} candidatos ({nomes})")
+        else:
+            print("Nenhum anexo foi detectado nas mensagens")
+
+        # Inicia servidor se solicitado
+        httpd = None
+        if args.servidor and args.pasta_midias and anexos_encontrados > 0:
+            httpd = iniciar_servidor_background(pasta_midias, args.porta)
+            time.sleep(1)  # Aguarda servidor iniciar
+
+        print(f"Arquivo HTML gerado: {arquivo_saida_html}")
+        
+        # Informa sobre anexos copiados
+        if args.standalone or (not args.servidor and args.pasta_midias and anexos_encontrados > 0):
+            pasta_anexos_criada = os.path.join(pasta_html_base, "anexos_conversa")
+            if os.path.exists(pasta_anexos_criada):
+                arquivos_copiados = sum(1 for entrada in os.scandir(pasta_anexos_criada) if entrada.is_file())
+                print(f"Anexos copiados para: {pasta_anexos_criada}")
+                print(f"Total de {arquivos_copiados} arquivos copiados")
+            materializacao = resumo["materializacao"]
+            if materializacao and materializacao["arquivos"]:
+                metodos = ", ".join(f"{quantidade} {metodo}s" for metodo, quantidade in sorted(materializacao["metodos"].items()))
+                print(f"Nesta execução: {materializacao['arquivos']} anexos ({metodos}), "
+                      f"{materializacao['bytes'] / 1024 / 1024:.1f} MB em {materializacao['segundos']:.1f}s")
+            if materializacao and materializacao["duplicados"]:
+                print(f"Conteúdo repetido: {materializacao['duplicados']} anexos apontam para a cópia de outro idêntico "
+                      f"({materializacao['bytes_evitados'] / 1024 / 1024:.1f} MB não copiados)")
+            if materializacao and materializacao["erros"]:
+                print(f"Falha ao copiar {len(materializacao['erros'])} anexos:")
+                for caminho, erro in materializacao["erros"]:
+                    print(f"   - {caminho}: {erro}")
+            miniaturas = resumo["miniaturas"]
+            if miniaturas:
+                print(f"Miniaturas: {miniaturas['geradas']} geradas, {miniaturas['do_cache']} reaproveitadas "
+                      f"em {miniaturas['segundos']:.1f}s (pasta {PASTA_MINIATURAS}/)")
+                for caminho, erro in miniaturas["erros"]:
+                    print(f"   Sem miniatura (exibido o original): {caminho}: {erro}")
+
+        if arquivo_saida_csv:
+            print(f"Arquivo CSV gerado: {arquivo_saida_csv}")
+        if resumo["csv_anexos"]:
+            print(f"Tabela de anexos gerada: {resumo['csv_anexos']}")
+        manifesto = resumo["manifesto"]
+        if manifesto:
+            print(f"Manifesto de hashes: {manifesto['csv']} e {manifesto['json']}")
+            print(f"   {manifesto['arquivos']} arquivos; {manifesto['lidos']} lidos "
+                  f"({manifesto['bytes_lidos'] / 1024 / 1024:.1f} MB) em {manifesto['segundos']:.1f}s, demais do cache")
+            for caminho, erro in manifesto["erros"]:
+                print(f"   Não foi possível ler {caminho}: {erro}")
+
+        print(f"\nProcessamento concluÃ­do!")
+        
+        if args.servidor and httpd:
+            print(f"Abrindo navegador...")
+            webbrowser.open(f'http://localhost:{args.porta}/{os.path.basename(arquivo_saida_html)}')
+            print(f"\nINSTRUÃ‡Ã•ES:")
+            print(f"   â€¢ O navegador abrirÃ¡ automaticamente")
+            print(f"   â€¢ Os anexos agora funcionarÃ£o corretamente")
+            print(f"   â€¢ Para PARAR o servidor: pressione Ctrl+C")
+            print(f"   â€¢ URL: http://localhost:{args.porta}")
+            
+            try:
+                print(f"\nServidor rodando... (Ctrl+C para parar)")
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                print(f"\nServidor parado pelo usuÃ¡rio")
+                httpd.shutdown()
+        else:
+            if args.standalone or (args.pasta_midias and anexos_encontrados > 0):
+                print(f"\nCOMO USAR:")
+                print(f"   â€¢ Abra o arquivo HTML: {arquivo_saida_html}")
+                print(f"   â€¢ Imagens carregarÃ£o automaticamente")
+                print(f"   â€¢ PDFs e documentos: clique para baixar")
+                print(f"   â€¢ Anexos foram copiados para pasta local")
+                print(f"\nPara visualizaÃ§Ã£o completa de PDFs no navegador:")
+                print(f"   python {sys.argv[0]} {args.arquivo} --pasta-midias {args.pasta_midias or 'Anexos'} --servidor")
+            else:
+                print(f"DICAS:")
+                print(f"   â€¢ Modo standalone: --standalone")
+                print(f"   â€¢ Servidor completo: --servidor")
+        
+    except Exception as e:
+        print(f"Erro durante o processamento: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
     main()
\ No newline at end of file